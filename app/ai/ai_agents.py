@@ -1,33 +1,41 @@
+import contextvars
+from functools import lru_cache
 from agents import (
     Agent,
     Runner,
     ModelSettings,
     function_tool,
-    AsyncOpenAI,
     OpenAIChatCompletionsModel,
 )
 from openai.types.responses import ResponseTextDeltaEvent
 
-from .rag import get_rag_instance
-from typing import List
-from ..config import settings
+from ..log_conf import logging
+from .rag import get_client, get_rag_instance, SemanticQueryCache
+from typing import Dict, List, Optional
 
+logger = logging.getLogger(__name__)
+
+# Post being chatted about; set per request so the shared tool stays stateless
+_post_id_ctx: contextvars.ContextVar[str] = contextvars.ContextVar("post_id")
+
+# Retrieval results per post, reused for repeated or near-identical queries
+_query_cache = SemanticQueryCache()
+
+
+DEFAULT_MODEL = "gemini-2.0-flash"
 
-def get_model():
-    gemini_client = AsyncOpenAI(
-        base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        api_key=settings.gemini_api_key,
-    )
 
+@lru_cache(maxsize=None)
+def get_model(model_name: str = DEFAULT_MODEL):
     model = OpenAIChatCompletionsModel(
-        openai_client=gemini_client, model="gemini-2.0-flash"
+        openai_client=get_client(), model=model_name
     )
 
     return model
 
 
-async def agent_runner(messages: List[dict], post_id: str):
-    instructions = """ **Your Core Identity:**
+PROMPTS = {
+    "default": """ **Your Core Identity:**
     You are an AI Q&A Assistant. Your job is to answer user questions.
 
     **Crucial Rules:**
@@ -35,26 +43,83 @@ async def agent_runner(messages: List[dict], post_id: str):
     2.  **Resilience is Key:** If you encounter an error or cannot find specific information, you MUST NOT halt the entire process.
     3.  **Scope Limitation:** Your research is strictly limited to `retrieval` tool. All search queries and analysis must adhere to this constraint.
     4.  **User-Facing Communication:** All complex work must happen silently in the background.
+    5.  **Query Variants:** Pass the question together with a few reformulations to the `retrieval` tool in a single call.
+    """,
+}
+
+
+async def _cached_retrieval(queries: List[str], post_id: str) -> List[List[Dict]]:
+    """
+    Results per query. Cache misses are embedded in one call and the
+    remaining index lookups run in parallel.
+    """
+    result_lists: List[Optional[List[Dict]]] = [
+        _query_cache.get(post_id, q) for q in queries
+    ]
+    misses = [i for i, results in enumerate(result_lists) if results is None]
+    if not misses:
+        return result_lists
+
+    rag = get_rag_instance()
+    vectors = await rag.embed_queries([queries[i] for i in misses])
+    to_fetch = []
+    for i, vector in zip(misses, vectors):
+        result_lists[i] = _query_cache.get_similar(post_id, vector)
+        if result_lists[i] is None:
+            to_fetch.append((i, vector))
+
+    if to_fetch:
+        fetched = await rag.multi_retrieval(
+            [queries[i] for i, _ in to_fetch],
+            post_id=post_id,
+            top_k=3,
+            query_vectors=[vector for _, vector in to_fetch],
+        )
+        for (i, _), results in zip(to_fetch, fetched):
+            result_lists[i] = results
+
+    for i, vector in zip(misses, vectors):
+        _query_cache.put(post_id, queries[i], vector, result_lists[i])
+    return result_lists
+
+
+@function_tool
+async def retrieval_tool(queries: List[str]) -> str:
+    """Tool for retrieving relevant documents from the vector store.
+
+    Args:
+        queries: The user question and any reformulations of it, searched in parallel.
     """
+    post_id = _post_id_ctx.get()
+    queries = [q for q in queries if q and q.strip()]
+    logger.debug(f"Retrieval tool called with queries {queries} for post {post_id}")
+    if not queries:
+        return "No query provided."
+    rag = get_rag_instance()
+    result_lists = await _cached_retrieval(queries, post_id)
+    results = rag.merge_results(result_lists, top_k=5)
+    prompt = rag.build_prompt(queries[0], results)
+    return prompt
 
-    @function_tool
-    async def retrieval_tool(query: str) -> str:
-        """Tool for retrieving relevant documents from the vector store."""
-        print("Retrieval tool called with query:", query, "and post_id:", post_id)
-        rag = get_rag_instance()
-        results = rag.retrieval(query, post_id=post_id, top_k=3)
-        prompt = rag.build_prompt(query, results)
-        return prompt
 
-    trademark_agent = Agent(
+@lru_cache(maxsize=None)
+def get_agent(preset: str = "default", model_name: str = DEFAULT_MODEL) -> Agent:
+    return Agent(
         name="Trademark detector",
-        model=get_model(),
-        instructions=instructions,
+        model=get_model(model_name),
+        instructions=PROMPTS[preset],
         tools=[retrieval_tool],
         model_settings=ModelSettings(temperature=0.1),
     )
 
-    result = Runner.run_streamed(trademark_agent, input=messages)
+
+# Built at import so the first request does not pay for agent setup
+trademark_agent = get_agent()
+
+
+async def agent_runner(messages: List[dict], post_id: str, preset: str = "default"):
+    _post_id_ctx.set(post_id)
+    result = Runner.run_streamed(get_agent(preset), input=messages)
     async for event in result.stream_events():
         if event.type == "raw_response_event" and isinstance(
             event.data, ResponseTextDeltaEvent
@@ -1,20 +1,70 @@
+import asyncio
+import bisect
+import hashlib
 import io
+import itertools
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from ..log_conf import logging
 from markitdown import MarkItDown
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pinecone import Pinecone, ServerlessSpec
-from typing import List, Dict, Optional, Tuple
-from uuid import uuid4
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 from ..config import settings
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 # Config
 EMBED_MODEL = "text-embedding-004"
 EMBED_DIM = 768
 PINECONE_INDEX = "docgram-index"
 PINECONE_REGION = "us-east-1"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+EMBED_CONCURRENCY = 4  # parallel embedding requests per upload
+UPSERT_CONCURRENCY = 2  # parallel Pinecone upserts per upload
+# Vectors per upsert request when embedded batches are waiting; well under
+# Pinecone's 2 MB request limit at 768 dims plus chunk text
+UPSERT_BATCH_SIZE = 100
+BATCH_POLL_SECONDS = 30  # how often to check an embeddings Batch API job
+EMBED_CACHE_SIZE = 4096  # chunk embeddings kept in memory for reuse
+
+_TOKEN_RE = re.compile(r"\S+")
+
+# PDF -> text conversion is CPU bound, so it runs in worker processes
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_unavailable = False
+_markitdown: Optional[MarkItDown] = None
+
+
+def _convert_pdf_bytes(file_bytes: bytes) -> str:
+    """
+    Convert PDF bytes to text. Top level so it can run in a worker process;
+    MarkItDown is built once per process.
+    """
+    global _markitdown
+    if _markitdown is None:
+        _markitdown = MarkItDown()
+    result = _markitdown.convert(io.BytesIO(file_bytes))
+    return result.text_content if hasattr(result, "text_content") else str(result)
+
+
+def _get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    global _pdf_pool, _pdf_pool_unavailable
+    if _pdf_pool is None and not _pdf_pool_unavailable:
+        try:
+            _pdf_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+        except (OSError, NotImplementedError) as e:
+            # e.g. AWS Lambda has no /dev/shm for multiprocessing primitives
+            logger.warning(f"PDF process pool unavailable, using threads: {e}")
+            _pdf_pool_unavailable = True
+    return _pdf_pool
 
 
 def _smart_chunk_text(
@@ -23,60 +73,183 @@ def _smart_chunk_text(
     """
     Chunk text at word boundaries. Returns list of (chunk_text, start_offset, end_offset)
     """
+    return list(_iter_text_chunks(text, chunk_size, overlap))
+
+
+def _iter_text_chunks(
+    text: str, chunk_size: int, overlap: int
+) -> Iterator[Tuple[str, int, int]]:
+    """
+    Lazy version of _smart_chunk_text, yields chunks as they are cut.
+    """
     if chunk_size <= 0:
         raise ValueError("chunk_size must be > 0")
-    tokens = text.split()  # simple whitespace tokenization (keeps code dependency-free)
-    if not tokens:
-        return []
-
-    # Reconstruct windows of tokens up to approx chunk_size characters
-    chunks = []
-    token_positions = []  # store (token, start_pos, end_pos)
-    pos = 0
-    for token in tokens:
-        # find next occurrence of token in text from pos
-        find_at = text.find(token, pos)
-        if find_at == -1:
-            # fallback: approximate
-            find_at = pos
-        token_positions.append((token, find_at, find_at + len(token)))
-        pos = find_at + len(token)
+    # single linear scan for whitespace-delimited tokens (keeps code dependency-free)
+    token_positions = [(m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+    if not token_positions:
+        return
+    token_starts = [s for s, _ in token_positions]
+    token_ends = [e for _, e in token_positions]
 
     i = 0
     n = len(token_positions)
     while i < n:
-        # accumulate tokens until approx chunk_size
-        start_pos = token_positions[i][1]
-        chunk_tokens = []
-        j = i
-        end_pos = start_pos
-        while j < n:
-            token, s, e = token_positions[j]
-            approx_len = e - start_pos
-            if approx_len > chunk_size and chunk_tokens:
-                break
-            chunk_tokens.append(token)
-            end_pos = e
-            j += 1
-        chunk_text = text[start_pos:end_pos]
-        chunks.append((chunk_text.strip(), start_pos, end_pos))
-        # advance i: go forward by token window minus overlap (in chars)
-        # find next i such that token_positions[next_i].1 >= end_pos - overlap_chars
+        # longest run of tokens that fits chunk_size (at least one token)
+        start_pos = token_starts[i]
+        j = max(bisect.bisect_right(token_ends, start_pos + chunk_size, i), i + 1)
+        if j < n:
+            # prefer cutting at a paragraph or line break in the back half
+            for sep in ("\n\n", "\n"):
+                cut = text.rfind(sep, start_pos + chunk_size // 2, token_ends[j - 1])
+                if cut != -1:
+                    k = bisect.bisect_right(token_ends, cut, i, j)
+                    if k > i:
+                        j = k
+                    break
+        end_pos = token_ends[j - 1]
+        yield text[start_pos:end_pos].strip(), start_pos, end_pos
+        # advance i: first token starting at or after end_pos - overlap
         overlap_target = max(start_pos, end_pos - overlap)
-        next_i = j
-        while next_i < n and token_positions[next_i][1] < overlap_target:
-            next_i += 1
+        next_i = bisect.bisect_left(token_starts, overlap_target, i, j)
         if next_i == i:  # ensure progress
             next_i = j
         i = next_i
-    return chunks
+
+
+class SemanticQueryCache:
+    """
+    Small in-process cache of retrieval results.
+
+    Exact hits are keyed by (scope, normalized query). Near-duplicate queries
+    hit when the cosine similarity of their embeddings is >= `threshold`.
+    With a `ttl` (seconds), entries stop matching once it has passed.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        semantic_size: int = 32,
+        threshold: float = 0.97,
+        ttl: Optional[float] = None,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        # key -> (expires_at, value)
+        self._exact: "OrderedDict[Tuple[Any, str], Tuple[float, Any]]" = OrderedDict()
+        self._maxsize = maxsize
+        # (scope, unit vector, expires_at, value) for the most recent queries
+        self._recent: deque = deque(maxlen=semantic_size)
+
+    def _expires_at(self) -> float:
+        return math.inf if self.ttl is None else time.monotonic() + self.ttl
+
+    @staticmethod
+    def _key(scope: Any, query: str) -> Tuple[Any, str]:
+        digest = hashlib.sha256(query.lower().strip().encode("utf-8")).hexdigest()
+        return scope, digest
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def get(self, scope: Any, query: str) -> Optional[Any]:
+        key = self._key(scope, query)
+        entry = self._exact.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._exact[key]
+            return None
+        self._exact.move_to_end(key)
+        return value
+
+    def get_similar(self, scope: Any, vector: List[float]) -> Optional[Any]:
+        unit = self._normalize(vector)
+        now = time.monotonic()
+        for cached_scope, cached_unit, expires_at, value in self._recent:
+            if cached_scope != scope or expires_at <= now:
+                continue
+            if sum(a * b for a, b in zip(unit, cached_unit)) >= self.threshold:
+                return value
+        return None
+
+    def put(self, scope: Any, query: str, vector: Optional[List[float]], value: Any) -> None:
+        key = self._key(scope, query)
+        expires_at = self._expires_at()
+        self._exact[key] = (expires_at, value)
+        self._exact.move_to_end(key)
+        if len(self._exact) > self._maxsize:
+            self._exact.popitem(last=False)
+        if vector is not None:
+            self._recent.append((scope, self._normalize(vector), expires_at, value))
+
+
+class EmbedBatcher:
+    """
+    Coalesces query embeddings from concurrent requests into one API call.
+    Texts arriving within `max_delay` seconds share a request of up to
+    `max_batch` inputs.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        max_batch: int = 32,
+        max_delay: float = 0.005,
+    ):
+        self.client = client
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()  # keep in-flight requests referenced
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._embed_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            res = await self.client.embeddings.create(
+                input=[text for text, _ in batch], model=self.model
+            )
+            for (_, future), record in zip(batch, res.data):
+                if not future.done():
+                    future.set_result(record.embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
 
 
 class RAGIndexer:
+    # index names already known to exist, shared across instances in this container
+    _known_indexes: set = set()
+
     def __init__(
         self,
         pinecone_client: Pinecone,
-        openai_client: OpenAI,
+        openai_client: AsyncOpenAI,
         index_name: str = PINECONE_INDEX,
         embed_model: str = EMBED_MODEL,
         embed_dim: int = EMBED_DIM,
@@ -88,8 +261,21 @@ class RAGIndexer:
         self.embed_model = embed_model
         self.embed_dim = embed_dim
         self.region = pinecone_region
+        self._index = None
+        self._query_batcher = EmbedBatcher(openai_client, embed_model)
+        # blake2b(text) -> embedding, shared by every upload on this instance
+        self._embedding_cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+
+    @property
+    def index(self):
+        # Resolve the index host once and reuse its pooled HTTP session
+        if self._index is None:
+            self._index = self.pc.Index(self.index_name)
+        return self._index
 
     def create_index_if_not_exists(self) -> None:
+        if self.index_name in self._known_indexes:
+            return
         if not self.pc.has_index(self.index_name):
             logger.info(f"Creating Pinecone index: {self.index_name}")
             spec = ServerlessSpec(cloud="aws", region=self.region)
@@ -105,114 +291,181 @@ class RAGIndexer:
         # sanity: check dimension (best-effort)
         # NOTE: Pinecone SDK specific methods differ by version; adapt if required.
         logger.debug("Index exists or was created.")
+        self._known_indexes.add(self.index_name)
 
-    def _extract_text_from_pdf(self, file_bytes: bytes) -> str:
-        md = MarkItDown()
-        buffer = io.BytesIO(file_bytes)
-        result = md.convert(buffer)
-        # Use filename without extension as prefix
-        text_content = (
-            result.text_content if hasattr(result, "text_content") else str(result)
-        )
-        return text_content
+    async def _extract_text_from_pdf(self, file_bytes: bytes) -> str:
+        pool = _get_pdf_pool()
+        if pool is not None:
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(pool, _convert_pdf_bytes, file_bytes)
+            except BrokenProcessPool as e:
+                logger.warning(f"PDF process pool broken, retrying in a thread: {e}")
+        return await asyncio.to_thread(_convert_pdf_bytes, file_bytes)
 
-    def pdf_to_chunks(
-        self, pdf_bytes: bytes, chunk_size: int = 1000, overlap: int = 200
+    async def pdf_to_chunks(
+        self,
+        pdf_bytes: bytes,
+        chunk_size: int = 1000,
+        overlap: int = 200,
+        post_id: Optional[str] = None,
+        text: Optional[str] = None,
     ) -> List[Dict]:
         """
         Returns list of dicts:
             {"chunk_id": str, "text": str, "source": filename, "start": int, "end": int}
+        `text` skips extraction when the caller already has the PDF's text.
         """
-        content = self._extract_text_from_pdf(pdf_bytes)
+        content = text
+        if content is None:
+            content = await self._extract_text_from_pdf(pdf_bytes)
         chunks_meta = _smart_chunk_text(content, chunk_size=chunk_size, overlap=overlap)
-        chunks = []
-        for idx, (chunk_text, start, end) in enumerate(chunks_meta):
-            chunks.append(
-                {
-                    "chunk_id": f"{uuid4().hex}",
-                    "text": chunk_text,
-                    "start": start,
-                    "end": end,
-                    "length": end - start,
-                }
-            )
-        return chunks
+        return [self._chunk_record(*meta, post_id=post_id) for meta in chunks_meta]
+
+    def _chunk_record(
+        self, chunk_text: str, start: int, end: int, post_id: Optional[str] = None
+    ) -> Dict:
+        # Deterministic id, so re-ingesting a post overwrites its vectors
+        chunk_id = hashlib.blake2b(
+            f"{post_id}:{start}:{chunk_text}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+        return {
+            "chunk_id": chunk_id,
+            "text": chunk_text,
+            "start": start,
+            "end": end,
+            "length": end - start,
+        }
 
     def _batch_iter(self, items: List, batch_size: int):
         for i in range(0, len(items), batch_size):
             yield items[i : i + batch_size], i, min(i + batch_size, len(items))
 
-    def _safe_create_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def _safe_create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Create embeddings for a list of texts. Repeated texts (headers, footers,
+        TOC lines) and texts embedded recently are only sent once.
+        """
+        keys = [hashlib.blake2b(t.encode("utf-8"), digest_size=16).digest() for t in texts]
+        # Hits are copied out before the await: concurrent batches may evict
+        # them from the shared cache in the meantime
+        found: Dict[bytes, List[float]] = {}
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            emb = self._embedding_cache.get(key)
+            if emb is None:
+                missing[key] = text
+            else:
+                self._embedding_cache.move_to_end(key)
+                found[key] = emb
+
+        if missing:
+            embeds = await self._create_embeddings_with_retry(list(missing.values()))
+            if len(embeds) != len(missing):
+                raise RuntimeError("Embedding length mismatch")
+            for key, emb in zip(missing, embeds):
+                found[key] = emb
+                self._embedding_cache[key] = emb
+                if len(self._embedding_cache) > EMBED_CACHE_SIZE:
+                    self._embedding_cache.popitem(last=False)
+
+        return [found[key] for key in keys]
+
+    async def _create_embeddings_with_retry(self, texts: List[str]) -> List[List[float]]:
         """
-        Create embeddings for a list of texts with simple retries.
+        Create embeddings for a list of texts with retries and exponential backoff.
         """
         max_retries = 3
         for attempt in range(1, max_retries + 1):
             try:
-                res = self.client.embeddings.create(input=texts, model=self.embed_model)
+                res = await self.client.embeddings.create(
+                    input=texts, model=self.embed_model
+                )
                 embeds = [record.embedding for record in res.data]
                 return embeds
             except Exception as e:
                 logger.warning(f"Embedding request failed (attempt {attempt}): {e}")
                 if attempt == max_retries:
                     raise
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
         return []
 
+    def _build_vectors(
+        self,
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        title: str,
+        post_id: Optional[str],
+    ) -> List[Dict]:
+        vectors = []
+        for emb, c in zip(embeddings, chunks):
+            metadata = {
+                "text": c.get("text"),
+                "post_id": post_id,
+                "source": title,
+                "start": c.get("start"),
+                "end": c.get("end"),
+                "length": c.get("length"),
+            }
+            vectors.append({"id": str(c["chunk_id"]), "values": emb, "metadata": metadata})
+        return vectors
+
     def delete_embeddings(self, post_id: str):
-        index = self.pc.Index(self.index_name)
+        index = self.index
         index.delete(filter={"post_id": post_id})
 
-    def upsert_chunks(
+    async def upsert_chunks(
         self,
         chunks: List[Dict],
         title: str,
         post_id: Optional[str] = None,
         batch_size: int = 32,
+        max_concurrency: int = EMBED_CONCURRENCY,
     ) -> str:
         """
-        Upsert chunks into pinecone. Returns summary dict with counts.
+        Upsert chunks into pinecone. Batches are embedded and upserted concurrently,
+        at most `max_concurrency` at a time.
         """
         if not chunks:
             return {"upserted": 0}
         self.create_index_if_not_exists()
-        index = self.pc.Index(self.index_name)
+        index = self.index
+        semaphore = asyncio.Semaphore(max_concurrency)
 
-        total_upserted = 0
-        for batch, start_idx, end_idx in self._batch_iter(chunks, batch_size):
-            try:
+        async def process_batch(batch: List[Dict], start_idx: int, end_idx: int) -> int:
+            async with semaphore:
                 texts = [c["text"] for c in batch]
-                ids = [c["chunk_id"] for c in batch]
 
-                embeddings = self._safe_create_embeddings(texts)
+                embeddings = await self._safe_create_embeddings(texts)
                 if len(embeddings) != len(texts):
                     raise RuntimeError("Embedding length mismatch")
 
-                vectors = []
-                for _id, emb, c in zip(ids, embeddings, batch):
-                    metadata = {
-                        "text": c.get("text"),
-                        "post_id": post_id,
-                        "source": title,
-                        "start": c.get("start"),
-                        "end": c.get("end"),
-                        "length": c.get("length"),
-                    }
-                    vectors.append(
-                        {"id": str(_id), "values": emb, "metadata": metadata}
-                    )
+                vectors = self._build_vectors(batch, embeddings, title, post_id)
 
-                # Upsert
-                _ = index.upsert(vectors=vectors)
-                total_upserted += len(vectors)
+                # Upsert (sync Pinecone client, keep it off the event loop)
+                _ = await asyncio.to_thread(index.upsert, vectors=vectors)
                 logger.info(
                     f"Upserted batch {start_idx}:{end_idx} -> {len(vectors)} vectors"
                 )
-            except Exception as e:
-                logger.exception(f"Failed to upsert batch {start_idx}:{end_idx}: {e}")
+                return len(vectors)
+
+        batches = list(self._batch_iter(chunks, batch_size))
+        results = await asyncio.gather(
+            *(process_batch(*b) for b in batches), return_exceptions=True
+        )
+
+        total_upserted = 0
+        for (_, start_idx, end_idx), res in zip(batches, results):
+            if isinstance(res, Exception):
+                logger.error(f"Failed to upsert batch {start_idx}:{end_idx}: {res}")
                 # continue with remaining batches
+                continue
+            total_upserted += res
         return f"upserted {total_upserted} chunks"
 
-    def upsert_pdf(
+    async def upsert_pdf(
         self,
         pdf_bytes: bytes,
         title: str,
@@ -220,43 +473,260 @@ class RAGIndexer:
         chunk_size: int = 1000,
         overlap: int = 200,
         batch_size: int = 32,
+        max_concurrency: int = EMBED_CONCURRENCY,
+        upsert_concurrency: int = UPSERT_CONCURRENCY,
+        text: Optional[str] = None,
+    ) -> str:
+        """
+        High-level helper: parse, embed and upsert a PDF. Pass `text` when
+        the PDF's text was already extracted to skip parsing it again.
+
+        The three stages run concurrently, connected by bounded queues, so
+        embedding starts with the first batch of chunks and upserts overlap
+        with embedding. Embedding and upserting each run several workers.
+        Queue bounds cap memory for large documents.
+        """
+        self.create_index_if_not_exists()
+        index = self.index
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency * 2)
+        vector_queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency * 2)
+        done = object()
+        total_upserted = 0
+
+        async def parse():
+            try:
+                content = text
+                if content is None:
+                    content = await self._extract_text_from_pdf(pdf_bytes)
+                batch = []
+                for meta in _iter_text_chunks(content, chunk_size, overlap):
+                    batch.append(self._chunk_record(*meta, post_id=post_id))
+                    if len(batch) == batch_size:
+                        await chunk_queue.put(batch)
+                        batch = []
+                if batch:
+                    await chunk_queue.put(batch)
+            finally:
+                for _ in range(max_concurrency):
+                    await chunk_queue.put(done)
+
+        async def embed_worker():
+            while (batch := await chunk_queue.get()) is not done:
+                try:
+                    texts = [c["text"] for c in batch]
+                    embeddings = await self._safe_create_embeddings(texts)
+                    if len(embeddings) != len(texts):
+                        raise RuntimeError("Embedding length mismatch")
+                    await vector_queue.put(
+                        self._build_vectors(batch, embeddings, title, post_id)
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to embed batch of {len(batch)} chunks: {e}")
+
+        async def embed():
+            try:
+                await asyncio.gather(*(embed_worker() for _ in range(max_concurrency)))
+            finally:
+                for _ in range(upsert_concurrency):
+                    await vector_queue.put(done)
+
+        async def upsert_worker():
+            nonlocal total_upserted
+            finished = False
+            while not finished and (vectors := await vector_queue.get()) is not done:
+                # Fold batches that are already waiting into the same request
+                while len(vectors) < UPSERT_BATCH_SIZE and not vector_queue.empty():
+                    more = vector_queue.get_nowait()
+                    if more is done:
+                        finished = True
+                        break
+                    vectors = vectors + more
+                try:
+                    await asyncio.to_thread(index.upsert, vectors=vectors)
+                    total_upserted += len(vectors)
+                    logger.info(f"Upserted {len(vectors)} vectors for post {post_id}")
+                except Exception as e:
+                    logger.exception(f"Failed to upsert {len(vectors)} vectors: {e}")
+
+        await asyncio.gather(
+            parse(),
+            embed(),
+            *(upsert_worker() for _ in range(upsert_concurrency)),
+        )
+        return f"upserted {total_upserted} chunks"
+
+    async def _submit_embedding_batch(self, chunks: List[Dict]) -> str:
+        """
+        Submit all chunk texts as one Batch API job. Returns the batch id.
+        """
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": c["chunk_id"],
+                    "method": "POST",
+                    "url": "/v1/embeddings",
+                    "body": {"model": self.embed_model, "input": c["text"]},
+                }
+            )
+            for c in chunks
+        ]
+        payload = "\n".join(lines).encode("utf-8")
+        batch_file = await self.client.files.create(
+            file=("embeddings.jsonl", payload), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/embeddings",
+            completion_window="24h",
+        )
+        return batch.id
+
+    async def _wait_for_embedding_batch(
+        self, batch_id: str, poll_seconds: int = BATCH_POLL_SECONDS
+    ) -> Dict[str, List[float]]:
+        """
+        Poll a Batch API job until it finishes. Returns {custom_id: embedding}.
+        """
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status == "completed":
+                break
+            if batch.status in ("failed", "expired", "cancelled"):
+                raise RuntimeError(f"Embedding batch {batch_id} {batch.status}")
+            await asyncio.sleep(poll_seconds)
+
+        output = await self.client.files.content(batch.output_file_id)
+        embeddings = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            body = (record.get("response") or {}).get("body") or {}
+            data = body.get("data") or []
+            if data:
+                embeddings[record["custom_id"]] = data[0]["embedding"]
+        return embeddings
+
+    async def upsert_pdf_batch(
+        self,
+        pdf_bytes: bytes,
+        title: str,
+        post_id: Optional[str] = None,
+        chunk_size: int = 1000,
+        overlap: int = 200,
+        batch_size: int = 100,
+        text: Optional[str] = None,
     ) -> str:
         """
-        High-level helper: read PDF (async UploadFile) and upsert chunks.
+        Like upsert_pdf, but embeds every chunk through one Batch API job.
+        Slower to complete, cheaper and not bound by online rate limits.
         """
-        chunks = self.pdf_to_chunks(pdf_bytes, chunk_size=chunk_size, overlap=overlap)
-        return self.upsert_chunks(chunks, title, post_id=post_id, batch_size=batch_size)
+        chunks = await self.pdf_to_chunks(
+            pdf_bytes,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            post_id=post_id,
+            text=text,
+        )
+        if not chunks:
+            return "upserted 0 chunks"
+
+        batch_id = await self._submit_embedding_batch(chunks)
+        logger.info(f"Submitted embedding batch {batch_id} for post {post_id}")
+        embeddings = await self._wait_for_embedding_batch(batch_id)
+
+        embedded = [c for c in chunks if c["chunk_id"] in embeddings]
+        if len(embedded) != len(chunks):
+            logger.warning(
+                f"Embedding batch {batch_id} returned {len(embedded)}/{len(chunks)} results"
+            )
 
-    def retrieval(
+        self.create_index_if_not_exists()
+        index = self.index
+        total_upserted = 0
+        for batch, start_idx, end_idx in self._batch_iter(embedded, batch_size):
+            vectors = self._build_vectors(
+                batch, [embeddings[c["chunk_id"]] for c in batch], title, post_id
+            )
+            await asyncio.to_thread(index.upsert, vectors=vectors)
+            total_upserted += len(vectors)
+        return f"upserted {total_upserted} chunks"
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed one or more query strings. Queries from concurrent requests are
+        coalesced into shared embedding calls.
+        """
+        return list(
+            await asyncio.gather(*(self._query_batcher.embed(q) for q in queries))
+        )
+
+    async def retrieval(
         self,
         query_text: str,
         post_id: Optional[str] = None,
         top_k: int = 5,
         include_metadata: bool = True,
+        query_vector: Optional[List[float]] = None,
     ) -> List[Dict]:
         """
         Returns list of matches: {"id", "score", "metadata", "text"}
+        Pass `query_vector` to reuse an embedding the caller already has.
         """
-        if not query_text:
+        if not query_text and query_vector is None:
             return []
 
-        index = self.pc.Index(self.index_name)
-        emb_res = self.client.embeddings.create(
-            input=query_text, model=self.embed_model
+        if query_vector is None:
+            query_vector = (await self.embed_queries([query_text]))[0]
+
+        return await self._query_index(query_vector, post_id, top_k, include_metadata)
+
+    async def multi_retrieval(
+        self,
+        queries: List[str],
+        post_id: Optional[str] = None,
+        top_k: int = 5,
+        include_metadata: bool = True,
+        query_vectors: Optional[List[List[float]]] = None,
+    ) -> List[List[Dict]]:
+        """
+        Retrieve for several queries at once: one batched embedding call, then
+        all index queries in parallel. Returns one result list per query.
+        Pass `query_vectors` to reuse embeddings the caller already has.
+        """
+        if query_vectors is not None:
+            vectors = query_vectors
+        else:
+            queries = [q for q in queries if q]
+            if not queries:
+                return []
+            vectors = await self.embed_queries(queries)
+        return await asyncio.gather(
+            *(
+                self._query_index(vector, post_id, top_k, include_metadata)
+                for vector in vectors
+            )
         )
-        dense_embedding = emb_res.data[0].embedding
 
+    async def _query_index(
+        self,
+        vector: List[float],
+        post_id: Optional[str],
+        top_k: int,
+        include_metadata: bool,
+    ) -> List[Dict]:
+        index = self.index
         query_filter = {"post_id": post_id} if post_id is not None else None
 
         query_kwargs = {
-            "vector": dense_embedding,
+            "vector": vector,
             "top_k": top_k,
             "include_metadata": include_metadata,
         }
         if query_filter:
             query_kwargs["filter"] = query_filter
 
-        res = index.query(**query_kwargs)
+        res = await asyncio.to_thread(index.query, **query_kwargs)
         matches = (
             res.get("matches", [])
             if isinstance(res, dict)
@@ -285,21 +755,37 @@ class RAGIndexer:
             )
         return results
 
+    @staticmethod
+    def merge_results(result_lists: List[List[Dict]], top_k: int = 5) -> List[Dict]:
+        """
+        Merge per-query results: dedupe by id keeping the best score, then
+        return the `top_k` highest scoring matches.
+        """
+        best: Dict[str, Dict] = {}
+        for results in result_lists:
+            for r in results:
+                current = best.get(r["id"])
+                if current is None or (r.get("score") or 0) > (current.get("score") or 0):
+                    best[r["id"]] = r
+        merged = sorted(best.values(), key=lambda r: r.get("score") or 0, reverse=True)
+        return merged[:top_k]
+
     def build_prompt(
         self, query: str, contexts: List[Dict], max_context_chars: int = 4000
     ) -> str:
         """
         Build a prompt (context + query) for an LLM. Truncates contexts to the most relevant until char budget is reached.
         """
-        assembled = ""
+        parts = []
         for c in contexts:
             meta = c.get("metadata", {})
             src = meta.get("source", "unknown")
             snippet = meta.get("text") or meta.get("content") or ""
-            candidate = f"Source: {src}\n{snippet}\n---\n"
-            if len(assembled) + len(candidate) > max_context_chars:
-                break
-            assembled += candidate
+            parts.append(f"Source: {src}\n{snippet}\n---\n")
+        # Keep the longest prefix of contexts that fits the budget
+        lengths = list(itertools.accumulate(map(len, parts)))
+        cutoff = bisect.bisect_right(lengths, max_context_chars)
+        assembled = "".join(parts[:cutoff])
         prompt = f"""You are an assistant. Use the following context to answer the user's question. Cite the 'Source' lines when relevant.
 
 Context:
@@ -312,8 +798,14 @@ Answer concisely and cite sources where useful."""
         return prompt
 
 
+@lru_cache(maxsize=1)
+def get_client() -> AsyncOpenAI:
+    # One Gemini client per container, shared by embeddings and the chat
+    # agent, so both reuse the same httpx connection pool
+    return AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=settings.gemini_api_key)
+
+
+@lru_cache(maxsize=1)
 def get_rag_instance() -> RAGIndexer:
-    gemini_base_url = "https://generativelanguage.googleapis.com/v1beta/openai/"
-    client = OpenAI(base_url=gemini_base_url, api_key=settings.gemini_api_key)
     pc = Pinecone(api_key=settings.pinecone_api_key)
-    return RAGIndexer(pc, client)
+    return RAGIndexer(pc, get_client())
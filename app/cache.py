@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries expire after a TTL.
+
+    Each entry may carry its own TTL (e.g. capped at a token's expiry);
+    `ttl` is the default and the upper bound.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Short-lived per-model item caches for read-mostly lookups
+MODEL_CACHE_SIZE = 5000
+MODEL_CACHE_TTL = 30
+_model_caches: Dict[type, TTLCache] = {}
+
+
+def _cache_for(model: type) -> TTLCache:
+    cache = _model_caches.get(model)
+    if cache is None:
+        cache = _model_caches.setdefault(
+            model, TTLCache(maxsize=MODEL_CACHE_SIZE, ttl=MODEL_CACHE_TTL)
+        )
+    return cache
+
+
+def cached_get(model: type, key: Hashable) -> Any:
+    """
+    `model.get(key)` through a short TTL cache. Items are shared between
+    requests, so only use this for display data and never mutate or save
+    the result. DoesNotExist is raised as usual and not cached.
+    """
+    cache = _cache_for(model)
+    item = cache.get(key)
+    if item is None:
+        item = model.get(key)
+        cache.set(key, item)
+    return item
+
+
+def cached_batch_get(model: type, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+    """
+    Batch version of `cached_get`, keyed by hash key. Cache misses are
+    fetched with BatchGetItem (PynamoDB pages it at 100 keys); missing
+    items are left out of the result.
+    """
+    cache = _cache_for(model)
+    found: Dict[Hashable, Any] = {}
+    misses = []
+    for key in dict.fromkeys(keys):
+        item = cache.get(key)
+        if item is None:
+            misses.append(key)
+        else:
+            found[key] = item
+    if misses:
+        hash_keyname = model._hash_keyname
+        for item in model.batch_get(misses):
+            key = getattr(item, hash_keyname)
+            cache.set(key, item)
+            found[key] = item
+    return found
+
+
+def invalidate(model: type, key: Hashable) -> None:
+    """Drop a cached item after it has been written"""
+    _cache_for(model).pop(key)
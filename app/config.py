@@ -15,6 +15,8 @@ class Settings(BaseSettings):
 
     gemini_api_key: str
     pinecone_api_key: str
+    async_batch_enabled: bool = False  # embed uploads via the Batch API
+    ingest_queue_url: Optional[str] = None  # process uploads from SQS when set
 
     class Config:
         env_file = ".env"
@@ -1,8 +1,14 @@
-from fastapi import Depends, HTTPException, status
+import asyncio
+import hashlib
+import json
+import time
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jws
+from jose.exceptions import ExpiredSignatureError, JWSError
 from datetime import datetime, timedelta, timezone
 
+from .cache import TTLCache, cached_get
 from .models import UserModel
 from .config import settings
 from .schemas import TokenData
@@ -13,14 +19,71 @@ SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
+DEFAULT_TOKEN_LIFETIME = timedelta(days=30)
+DEFAULT_TOKEN_LIFETIME_SECONDS = DEFAULT_TOKEN_LIFETIME.total_seconds()
+
+# Built once per container instead of on every encode/decode
+_SIGNING_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
+
+# Verified results keyed by sha256(token); entries never outlive the token
+TOKEN_CACHE_TTL = 60
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+# Tokens that failed verification, as (error type, message); a bad
+# signature never becomes valid. Exceptions themselves are not kept: each
+# re-raise would grow their traceback for as long as they are cached
+_rejected_tokens = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def _remaining_ttl(payload: dict) -> float:
+    exp = payload.get("exp")
+    if exp is None:
+        return TOKEN_CACHE_TTL
+    return min(TOKEN_CACHE_TTL, exp - time.time())
+
+
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT, reusing the result for repeat tokens. Raises JWTError."""
+    key = _token_key(token)
+    payload = _token_cache.get(key)
+    if payload is None:
+        rejected = _rejected_tokens.get(key)
+        if rejected is not None:
+            error_type, message = rejected
+            raise error_type(message)
+        try:
+            payload = _verify_jwt(token)
+        except JWTError as e:
+            _rejected_tokens.set(key, (type(e), str(e)))
+            raise
+        _token_cache.set(key, payload, ttl=_remaining_ttl(payload))
+    return payload
+
+
+def _verify_jwt(token: str) -> dict:
+    """Check the signature with the prebuilt key, then the only claim we issue: exp"""
+    try:
+        payload = json.loads(jws.verify(token, _SIGNING_KEY, [ALGORITHM]))
+    except (JWSError, ValueError) as e:
+        raise JWTError(str(e))
+    if not isinstance(payload, dict):
+        raise JWTError("Invalid payload")
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        raise ExpiredSignatureError("Signature has expired.")
+    return payload
+
 
 def verify_access_token(token: str, credentials_exception):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        id: str = payload.get("user_id")
-        if id is None:
+        payload = decode_access_token(token)
+        user_id: str = payload.get("sub")
+        if user_id is None:
             raise credentials_exception
-        token_data = TokenData(id=id)
+        token_data = TokenData(user_id=user_id)
     except JWTError:
         raise credentials_exception
 
@@ -28,35 +91,84 @@ def verify_access_token(token: str, credentials_exception):
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(days=30)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    expire = datetime.now(timezone.utc) + (expires_delta or DEFAULT_TOKEN_LIFETIME)
+    # exp as a NumericDate, signed directly: the same token jwt.encode produces
+    to_encode = {**data, "exp": int(expire.timestamp())}
+    encoded_jwt = jws.sign(to_encode, _SIGNING_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
+def create_access_token_for_user(user_id: str) -> str:
+    """Token for a login/registration: just the subject and default expiry"""
+    expire = int(time.time() + DEFAULT_TOKEN_LIFETIME_SECONDS)
+    return jws.sign({"sub": user_id, "exp": expire}, _SIGNING_KEY, algorithm=ALGORITHM)
+
+
+async def get_current_user_id(
+    request: Request, token: str = Depends(oauth2_scheme)
+) -> str:
+    """
+    Authenticated user id from the signed "sub" claim. No database read;
+    use get_current_active_user when the user record itself is needed.
+    The outcome is kept on request.state, so the token is checked once per request.
+    """
+    state = request.state
+    if getattr(state, "auth_error", None) is not None:
+        raise state.auth_error
+    if getattr(state, "user_id", None) is not None:
+        return state.user_id
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+        state.user_id = verify_access_token(token, credentials_exception).user_id
+    except HTTPException as e:
+        state.auth_error = e
+        raise
+    return state.user_id
 
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
-    # Get user from PynamoDB
+async def get_current_active_user(
+    request: Request, user_id: str = Depends(get_current_user_id)
+) -> UserModel:
+    """
+    Authenticated user's record, read fresh; rejects tokens of deleted
+    users. It is also kept on request.state for get_current_user, so a
+    request needing both reads the user once.
+    """
     try:
-        user = UserModel.get(hash_key=user_id)
+        user = await asyncio.to_thread(UserModel.get, user_id)
     except UserModel.DoesNotExist:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    request.state.user = user
+    return user
 
-    return user.user_id
+
+async def get_current_user(
+    request: Request, user_id: str = Depends(get_current_user_id)
+) -> UserModel:
+    """
+    Authenticated user's record for display (response payloads). Served
+    from the shared item cache and kept on request.state, so it must not
+    be mutated or saved; use get_current_active_user for that.
+    """
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    try:
+        user = await asyncio.to_thread(cached_get, UserModel, user_id)
+    except UserModel.DoesNotExist:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    request.state.user = user
+    return user
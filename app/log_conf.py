@@ -1,12 +1,11 @@
-import logging, sys
+import logging, os, sys
 
 logging.basicConfig(
     stream=sys.stdout,
-    level=logging.INFO,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s %(levelname)s %(name)s %(message)s",
     force=True,          # Python 3.8+; forces basicConfig to override existing handlers
 )
 
-# Mirror handlers to uvicorn loggers (if your code or libraries use them)
-root_handlers = logging.getLogger().handlers
-logging.getLogger("mangum").handlers = root_handlers
+# Let library loggers reach the root handler once instead of sharing its handler list
+logging.getLogger("mangum").propagate = True
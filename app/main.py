@@ -1,15 +1,37 @@
 # app/main.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, Request, HTTPException
 from datetime import datetime, timezone
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import RedirectResponse
 from mangum import Mangum
 from .log_conf import logging
+from .responses import FastJSONResponse
 from . import routers
+from .ai.rag import get_rag_instance
+from .ai.ai_agents import get_agent, get_client
+from .worker import is_sqs_event, handle_sqs_event
+from .models import open_connections
 
+try:
+    import uvloop
+except ImportError:  # e.g. Windows dev machines
+    uvloop = None
 
-app = FastAPI(version="1.0.0", title="DocGram API")
+# Mangum and the SQS worker drive their loop with run_until_complete;
+# with the policy set, that loop is uvloop's
+if uvloop is not None:
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+app = FastAPI(
+    version="1.0.0",
+    title="DocGram API",
+    default_response_class=FastJSONResponse,
+)
 origins = ["*"]
 app.add_middleware(
     CORSMiddleware,
@@ -17,9 +39,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Compresses JSON bodies over 500 bytes; event streams are left alone
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 app.include_router(routers.user.router)
 app.include_router(routers.auth.router)
@@ -27,6 +51,42 @@ app.include_router(routers.post.router)
 app.include_router(routers.chat.router)
 app.include_router(routers.toggles.post_router)
 app.include_router(routers.toggles.user_router)
+app.include_router(routers.jobs.router)
+
+# Blocking DynamoDB/S3 calls run in the default executor via asyncio.to_thread
+THREAD_POOL_SIZE = 64
+# Created once: Mangum runs the startup events on every invocation
+_executor = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE)
+_clients_warmed = False
+
+
+@app.on_event("startup")
+async def configure_thread_pool():
+    """Size the default executor for I/O bound boto3 calls"""
+    asyncio.get_running_loop().set_default_executor(_executor)
+
+
+@app.on_event("startup")
+async def warm_up_clients():
+    """
+    Open pooled connections to DynamoDB, Gemini and Pinecone before the
+    first request; once per container, not per invocation
+    """
+    global _clients_warmed
+    if _clients_warmed:
+        return
+    _clients_warmed = True
+    try:
+        get_agent()
+        rag = get_rag_instance()
+        await asyncio.gather(
+            asyncio.to_thread(open_connections),
+            rag.embed_queries(["warmup"]),
+            asyncio.to_thread(rag.index.describe_index_stats),
+            get_client().models.list(),
+        )
+    except Exception as e:
+        logger.warning(f"Client warm-up failed: {e}")
 
 
 @app.get("/")
@@ -53,4 +113,11 @@ async def internal_error_handler(request: Request, exc: HTTPException):
     return JSONResponse(status_code=500, content={"detail": "Internal server error"})
 
 
-handler = Mangum(app)
+http_handler = Mangum(app)
+
+
+def handler(event, context):
+    """Lambda entry point: ingest queue batches go to the worker, the rest to the API"""
+    if is_sqs_event(event):
+        return handle_sqs_event(event)
+    return http_handler(event, context)
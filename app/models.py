@@ -1,27 +1,73 @@
-from datetime import datetime
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Set, Tuple
 from .config import settings
 import uuid
+import boto3
+from botocore.config import Config
+from pynamodb.connection import Connection
 from pynamodb.models import Model
+from pynamodb.transactions import TransactGet, TransactWrite
 from pynamodb.attributes import (
     UnicodeAttribute,
     UTCDateTimeAttribute,
     BooleanAttribute,
     NumberAttribute,
     JSONAttribute,
+    TTLAttribute,
 )
-from pynamodb.indexes import AllProjection, GlobalSecondaryIndex
+from pynamodb.indexes import AllProjection, GlobalSecondaryIndex, KeysOnlyProjection
 import os
 
 # Environment configuration for DynamoDB
 REGION = settings.aws_region
 STAGE = settings.stage
 
+def utc_now() -> datetime:
+    """Timezone-aware current time; every stored timestamp is UTC"""
+    return datetime.now(timezone.utc)
+
+
+# Connection pool and retry policy shared by every DynamoDB client
+MAX_POOL_CONNECTIONS = 50
+MAX_RETRY_ATTEMPTS = 2
+# Fail fast on a stuck connect and let the retry pick a fresh connection
+CONNECT_TIMEOUT = 3
+
+# Low-level client for multi-table batch reads, which PynamoDB does not offer
+dynamodb_client = boto3.client(
+    "dynamodb",
+    region_name=REGION,
+    config=Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": MAX_RETRY_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+    ),
+)
+# Shared by transactions so each one reuses the same botocore client
+transaction_connection = Connection(
+    region=REGION,
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    max_retry_attempts=MAX_RETRY_ATTEMPTS,
+    connect_timeout_seconds=CONNECT_TIMEOUT,
+)
+
+
+def transact_write() -> TransactWrite:
+    """Context manager committing its writes in one TransactWriteItems call"""
+    return TransactWrite(connection=transaction_connection)
+
+
+def transact_get() -> TransactGet:
+    """Context manager reading its items in one TransactGetItems call"""
+    return TransactGet(connection=transaction_connection)
+
 
 class UserEmailIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "email-index"
-        projection = AllProjection()  # More efficient for lookups
+        projection = KeysOnlyProjection()  # only used to find item keys
 
     email = UnicodeAttribute(hash_key=True)
 
@@ -29,11 +75,20 @@ class UserEmailIndex(GlobalSecondaryIndex):
 class UsernameIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "username-index"
-        projection = AllProjection()
+        projection = KeysOnlyProjection()  # only used to find item keys
 
     username = UnicodeAttribute(hash_key=True)
 
 
+class SuperuserIndex(GlobalSecondaryIndex):
+    class Meta:
+        index_name = "superuser-index"
+        projection = AllProjection()  # a handful of rows, read by manage.py
+
+    # Sparse: only superusers carry admin_flag
+    admin_flag = NumberAttribute(hash_key=True)
+
+
 class UserModel(Model):
     """
     User model for DynamoDB
@@ -55,6 +110,7 @@ class UserModel(Model):
     # User attributes
     first_name = UnicodeAttribute(null=True)
     last_name = UnicodeAttribute(null=True)
+    full_name = UnicodeAttribute(null=True)  # denormalized from first/last name
     bio = UnicodeAttribute(null=True)
     avatar_url = UnicodeAttribute(null=True)  # S3 URL
 
@@ -66,15 +122,23 @@ class UserModel(Model):
     # Status fields
     is_active = BooleanAttribute(default=True)
     is_superuser = BooleanAttribute(default=False)
+    # 1 for superusers, unset otherwise (keeps superuser_index sparse)
+    admin_flag = NumberAttribute(null=True)
 
     # Timestamps
-    created_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
     last_login = UTCDateTimeAttribute(null=True)
 
     # GSI for email lookup
     email_index = UserEmailIndex()
     # GSI for username lookup
     username_index = UsernameIndex()
+    # GSI listing superusers
+    superuser_index = SuperuserIndex()
+
+    @staticmethod
+    def build_full_name(first_name: str, last_name: str) -> str:
+        return f"{first_name or ''} {last_name or ''}".strip()
 
 
 class FollowingIndex(GlobalSecondaryIndex):
@@ -109,7 +173,7 @@ class FollowModel(Model):
     relationship_id = UnicodeAttribute(hash_key=True)  # follower_id#following_id
     follower_id = UnicodeAttribute()
     following_id = UnicodeAttribute()
-    created_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
 
     # GSI for reverse lookups (who is following this user)
     following_index = FollowingIndex()
@@ -117,9 +181,9 @@ class FollowModel(Model):
     # GSI for follower lookups (who is this user following)
     follower_index = FollowerIndex()
 
-    @classmethod
-    def create_relationship_id(cls, follower_id: str, following_id: str) -> str:
-        return f"{follower_id}#{following_id}"
+    @staticmethod
+    def create_relationship_id(follower_id: str, following_id: str) -> str:
+        return follower_id + "#" + following_id
 
 
 class UserPostIndex(GlobalSecondaryIndex):
@@ -136,6 +200,8 @@ class PublicPostIndex(GlobalSecondaryIndex):
         index_name = "public-posts-index"
         projection = AllProjection()  # More efficient for lookups
 
+    # Sparse: private posts have no is_public attribute, so they never
+    # land in this index
     is_public = NumberAttribute(hash_key=True)
     created_at = UTCDateTimeAttribute(range_key=True)
 
@@ -170,12 +236,12 @@ class PostModel(Model):
     comments_count = NumberAttribute(default=0)
     shares_count = NumberAttribute(default=0)
 
-    # Status
-    is_public = NumberAttribute(default=1)
+    # Status: 1 when public, unset when private (keeps public_posts_index sparse)
+    is_public = NumberAttribute(default_for_new=1, null=True)
 
     # Timestamps
-    created_at = UTCDateTimeAttribute(default=datetime.now)
-    updated_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
+    updated_at = UTCDateTimeAttribute(default=utc_now)
 
     # GSI for user posts lookup
     user_posts_index = UserPostIndex()
@@ -187,7 +253,7 @@ class PostModel(Model):
 class UserLikeIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "user-likes-index"
-        projection = AllProjection()  # More efficient for lookups
+        projection = KeysOnlyProjection()  # only used to find item keys
 
     user_id = UnicodeAttribute(hash_key=True)
     created_at = UTCDateTimeAttribute(range_key=True)
@@ -196,7 +262,7 @@ class UserLikeIndex(GlobalSecondaryIndex):
 class PostLikeIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "post-likes-index"
-        projection = AllProjection()  # More efficient for lookups
+        projection = KeysOnlyProjection()  # only used to find item keys
 
     post_id = UnicodeAttribute(hash_key=True)
     created_at = UTCDateTimeAttribute(range_key=True)
@@ -216,17 +282,17 @@ class LikeModel(Model):
     like_id = UnicodeAttribute(hash_key=True)  # post_id#user_id
     post_id = UnicodeAttribute()
     user_id = UnicodeAttribute()
-    created_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
 
     # GSI for user's likes lookup
-    user_likes_index = UserLikeIndex
+    user_likes_index = UserLikeIndex()
 
     # GSI for post's likes lookup
     post_likes_index = PostLikeIndex()
 
-    @classmethod
-    def create_like_id(cls, post_id: str, user_id: str) -> str:
-        return f"{post_id}#{user_id}"
+    @staticmethod
+    def create_like_id(post_id: str, user_id: str) -> str:
+        return post_id + "#" + user_id
 
 
 class PostCommentIndex(GlobalSecondaryIndex):
@@ -257,7 +323,7 @@ class CommentModel(Model):
     post_id = UnicodeAttribute()
     user_id = UnicodeAttribute()
     content = UnicodeAttribute()
-    created_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
 
     # GSI for post comments lookup
     post_comments_index = PostCommentIndex()
@@ -275,7 +341,7 @@ class UserConversationIndex(GlobalSecondaryIndex):
 class PostConversationIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "post-conversations-index"
-        projection = AllProjection()  # More efficient for lookups
+        projection = KeysOnlyProjection()  # only used to find item keys
 
     post_id = UnicodeAttribute(hash_key=True)
     updated_at = UTCDateTimeAttribute(range_key=True)
@@ -302,14 +368,14 @@ class ChatConversationModel(Model):
     title = UnicodeAttribute(null=True)  # Optional conversation title
 
     # Timestamps
-    created_at = UTCDateTimeAttribute(default=datetime.now)
-    updated_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
+    updated_at = UTCDateTimeAttribute(default=utc_now)
 
     # GSI for user conversations lookup
     user_conversations_index = UserConversationIndex()
 
     # GSI for PDF conversations lookup
-    pdf_conversations_index = PostConversationIndex
+    pdf_conversations_index = PostConversationIndex()
 
 
 class ConversationMessageIndex(GlobalSecondaryIndex):
@@ -340,7 +406,7 @@ class ChatMessageModel(Model):
     conversation_id = UnicodeAttribute()
     role = UnicodeAttribute()  # "user" or "assistant"
     content = UnicodeAttribute()
-    timestamp = UTCDateTimeAttribute(default=datetime.now)
+    timestamp = UTCDateTimeAttribute(default=utc_now)
 
     # Metadata for AI responses
     metadata = JSONAttribute(null=True)  # For storing AI model info, tokens used, etc.
@@ -378,7 +444,7 @@ class UserBookmarkIndex(GlobalSecondaryIndex):
 class PostBookmarkIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "post-bookmarks-index"
-        projection = AllProjection()
+        projection = KeysOnlyProjection()  # only used to find item keys
 
     post_id = UnicodeAttribute(hash_key=True)
     created_at = UTCDateTimeAttribute(range_key=True)
@@ -398,7 +464,7 @@ class BookmarkModel(Model):
     bookmark_id = UnicodeAttribute(hash_key=True)  # post_id#user_id
     post_id = UnicodeAttribute()
     user_id = UnicodeAttribute()
-    created_at = UTCDateTimeAttribute(default=datetime.now)
+    created_at = UTCDateTimeAttribute(default=utc_now)
 
     # GSI for user's bookmarks lookup
     user_bookmarks_index = UserBookmarkIndex()
@@ -406,44 +472,299 @@ class BookmarkModel(Model):
     # GSI for post's bookmarks lookup
     post_bookmarks_index = PostBookmarkIndex()
 
-    @classmethod
-    def create_bookmark_id(cls, post_id: str, user_id: str) -> str:
-        return f"{post_id}#{user_id}"
+    @staticmethod
+    def create_bookmark_id(post_id: str, user_id: str) -> str:
+        return post_id + "#" + user_id
+
+
+class IngestJobModel(Model):
+    """
+    Status of a background post upload: pending -> processing -> embedding -> done/failed
+    """
+
+    class Meta:
+        table_name = f"docgram-{STAGE}-ingest-jobs"
+        region = REGION
+        billing_mode = "PAY_PER_REQUEST"
+
+    job_id = UnicodeAttribute(hash_key=True, default_for_new=lambda: str(uuid.uuid4()))
+    user_id = UnicodeAttribute()
+    post_id = UnicodeAttribute(null=True)  # set once the post record exists
+    status = UnicodeAttribute(default="pending")
+    error = UnicodeAttribute(null=True)
+    created_at = UTCDateTimeAttribute(default=utc_now)
+    updated_at = UTCDateTimeAttribute(default=utc_now)
+
+
+class FeedModel(Model):
+    """
+    Materialized home feed: one row per post per reader, written when the
+    post is created (fan-out on write)
+    """
+
+    class Meta:
+        table_name = f"docgram-{STAGE}-feed"
+        region = REGION
+        billing_mode = "PAY_PER_REQUEST"
+
+    user_id = UnicodeAttribute(hash_key=True)  # the reader
+    # "<post created_at>#<post_id>": newest-first by time, and unique when
+    # posts share a timestamp. Stored under the original created_at key name,
+    # so rows written before the post id was appended still sort with them
+    sort_key = UnicodeAttribute(range_key=True, attr_name="created_at")
+    post_id = UnicodeAttribute()
+    author_id = UnicodeAttribute()
+    # Rows age out (DynamoDB TTL) so feeds do not grow without bound
+    expires_at = TTLAttribute(null=True)
+
+
+# Flags for get_current_user_context's `need`
+CONTEXT_FOLLOW = 1
+CONTEXT_LIKE = 2
+CONTEXT_BOOKMARK = 4
+CONTEXT_ALL = CONTEXT_FOLLOW | CONTEXT_LIKE | CONTEXT_BOOKMARK
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+
+
+def _existing_keys(keys: List[Tuple[str, str, str]]) -> Set[Tuple[str, str]]:
+    """
+    (table name, key value) of the given (table name, key attribute, key
+    value) triples that exist, fetched by key only with BatchGetItem
+    """
+    found = set()
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request_items = {}
+        for table, key_name, key_value in keys[start : start + BATCH_GET_LIMIT]:
+            request_items.setdefault(
+                table, {"Keys": [], "ProjectionExpression": key_name}
+            )["Keys"].append({key_name: {"S": key_value}})
+
+        for _ in range(3):  # retry throttled keys a couple of times
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            for table, items in response.get("Responses", {}).items():
+                for item in items:
+                    for value in item.values():
+                        found.add((table, value["S"]))
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                break
+    return found
 
 
 def get_current_user_context(
-    user_id: str, target_user_id: str = None, post_id: str = None
+    user_id: str,
+    target_user_id: str = None,
+    post_id: str = None,
+    need: int = CONTEXT_ALL,
 ) -> Dict[str, Any]:
     """
     Helper function to get context-dependent data (is_following, is_liked, is_bookmarked)
-    Optimized for Lambda by batching queries when possible
-    """
-    context = {}
-
-    if target_user_id and user_id != target_user_id:
-        # Check if current user follows target user
-        follow_id = FollowModel.create_relationship_id(user_id, target_user_id)
-        try:
-            FollowModel.get(follow_id)
-            context["is_following"] = True
-        except FollowModel.DoesNotExist:
-            context["is_following"] = False
-
-    if post_id:
-        # Check if current user liked the post
-        like_id = LikeModel.create_like_id(post_id, user_id)
-        try:
-            LikeModel.get(like_id)
-            context["is_liked"] = True
-        except LikeModel.DoesNotExist:
-            context["is_liked"] = False
-
-        # Check if current user bookmarked the post
-        bookmark_id = BookmarkModel.create_bookmark_id(post_id, user_id)
-        try:
-            BookmarkModel.get(bookmark_id)
-            context["is_bookmarked"] = True
-        except BookmarkModel.DoesNotExist:
-            context["is_bookmarked"] = False
-
-    return context
+    All lookups go out as a single BatchGetItem across the three tables;
+    `need` limits it to the fields the caller renders
+    """
+    # context key -> (table name, key attribute, key value)
+    lookups = {}
+    if need & CONTEXT_FOLLOW and target_user_id and user_id != target_user_id:
+        lookups["is_following"] = (
+            FollowModel.Meta.table_name,
+            "relationship_id",
+            FollowModel.create_relationship_id(user_id, target_user_id),
+        )
+    if post_id and need & CONTEXT_LIKE:
+        lookups["is_liked"] = (
+            LikeModel.Meta.table_name,
+            "like_id",
+            LikeModel.create_like_id(post_id, user_id),
+        )
+    if post_id and need & CONTEXT_BOOKMARK:
+        lookups["is_bookmarked"] = (
+            BookmarkModel.Meta.table_name,
+            "bookmark_id",
+            BookmarkModel.create_bookmark_id(post_id, user_id),
+        )
+    if not lookups:
+        return {}
+
+    found = _existing_keys(list(lookups.values()))
+    return {
+        name: (table, key_value) in found
+        for name, (table, _, key_value) in lookups.items()
+    }
+
+
+def get_posts_context(
+    user_id: str,
+    post_ids: Iterable[str],
+    need: int = CONTEXT_LIKE | CONTEXT_BOOKMARK,
+) -> Dict[str, Set[str]]:
+    """
+    `get_current_user_context` for a page of posts: the ids of the posts
+    the user liked / bookmarked, from one BatchGetItem per 100 keys
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    tables = {}
+    if need & CONTEXT_LIKE:
+        tables["is_liked"] = (
+            LikeModel.Meta.table_name,
+            "like_id",
+            LikeModel.create_like_id,
+        )
+    if need & CONTEXT_BOOKMARK:
+        tables["is_bookmarked"] = (
+            BookmarkModel.Meta.table_name,
+            "bookmark_id",
+            BookmarkModel.create_bookmark_id,
+        )
+
+    keys = [
+        (table, key_name, make_id(post_id, user_id))
+        for table, key_name, make_id in tables.values()
+        for post_id in post_ids
+    ]
+    found = _existing_keys(keys) if keys else set()
+    return {
+        name: {
+            post_id
+            for post_id in post_ids
+            if (table, make_id(post_id, user_id)) in found
+        }
+        for name, (table, _, make_id) in tables.items()
+    }
+
+
+def get_following_context(user_id: str, target_user_ids: Iterable[str]) -> Set[str]:
+    """
+    `get_current_user_context`'s is_following for a page of users: the ids
+    among `target_user_ids` that the user follows, from one BatchGetItem
+    per 100 keys
+    """
+    target_user_ids = [
+        target_id
+        for target_id in dict.fromkeys(target_user_ids)
+        if target_id != user_id
+    ]
+    table = FollowModel.Meta.table_name
+    keys = [
+        (
+            table,
+            "relationship_id",
+            FollowModel.create_relationship_id(user_id, target_id),
+        )
+        for target_id in target_user_ids
+    ]
+    found = _existing_keys(keys) if keys else set()
+    return {
+        target_id
+        for target_id in target_user_ids
+        if (table, FollowModel.create_relationship_id(user_id, target_id)) in found
+    }
+
+
+# Posts copied into (or removed from) a feed when its reader (un)follows
+FEED_BACKFILL_POSTS = 20
+FEED_RETENTION = timedelta(days=90)
+# BatchWriteItem takes 25 rows; big follower lists are written in parallel
+FEED_WRITE_BATCH = 25
+FEED_WRITE_CONCURRENCY = 8
+
+
+def _feed_sort_key(post: PostModel) -> str:
+    # The fixed-width UTC timestamp format keeps string order chronological
+    return f"{PostModel.created_at.serialize(post.created_at)}#{post.post_id}"
+
+
+def _feed_entry(reader_id: str, post: PostModel) -> FeedModel:
+    return FeedModel(
+        user_id=reader_id,
+        sort_key=_feed_sort_key(post),
+        post_id=post.post_id,
+        author_id=post.user_id,
+        expires_at=post.created_at + FEED_RETENTION,
+    )
+
+
+def _write_feed_entries(reader_ids: List[str], post: PostModel) -> None:
+    with FeedModel.batch_write() as batch:
+        for reader_id in reader_ids:
+            batch.save(_feed_entry(reader_id, post))
+
+
+def fan_out_post(post: PostModel) -> None:
+    """
+    Write a new post into its author's feed and, if public, into every
+    follower's. Each 25-row BatchWriteItem is independent, so up to
+    FEED_WRITE_CONCURRENCY of them are in flight at once.
+    """
+    reader_ids = [post.user_id]
+    if post.is_public == 1:
+        reader_ids.extend(
+            follow.follower_id
+            for follow in FollowModel.following_index.query(hash_key=post.user_id)
+        )
+    chunks = [
+        reader_ids[i : i + FEED_WRITE_BATCH]
+        for i in range(0, len(reader_ids), FEED_WRITE_BATCH)
+    ]
+    if len(chunks) == 1:
+        _write_feed_entries(chunks[0], post)
+        return
+    with ThreadPoolExecutor(max_workers=FEED_WRITE_CONCURRENCY) as pool:
+        # list() re-raises the first failed batch
+        list(pool.map(lambda chunk: _write_feed_entries(chunk, post), chunks))
+
+
+def sync_feed_after_follow(follower_id: str, author_id: str, following: bool) -> None:
+    """Copy the author's recent public posts into the feed, or remove them"""
+    posts = PostModel.user_posts_index.query(
+        hash_key=author_id, scan_index_forward=False, limit=FEED_BACKFILL_POSTS
+    )
+    with FeedModel.batch_write() as batch:
+        for post in posts:
+            if not following:
+                batch.delete(FeedModel(follower_id, _feed_sort_key(post)))
+                # Rows from before the post id was part of the key
+                legacy_key = PostModel.created_at.serialize(post.created_at)
+                batch.delete(FeedModel(follower_id, legacy_key))
+            elif post.is_public == 1:
+                batch.save(_feed_entry(follower_id, post))
+
+
+TABLE_MODELS = (
+    UserModel,
+    PostModel,
+    LikeModel,
+    CommentModel,
+    FollowModel,
+    ChatConversationModel,
+    ChatMessageModel,
+    Notification,
+    BookmarkModel,
+    IngestJobModel,
+    FeedModel,
+)
+
+
+# Connection settings only; PynamoDB builds each table's client lazily,
+# and warm_up_clients in main.py opens them through open_connections
+for _model in TABLE_MODELS:
+    _model.Meta.max_pool_connections = MAX_POOL_CONNECTIONS
+    _model.Meta.max_retry_attempts = MAX_RETRY_ATTEMPTS
+    _model.Meta.connect_timeout_seconds = CONNECT_TIMEOUT
+
+
+def open_connections() -> None:
+    """
+    One cheap DescribeTable per client, in parallel, so the clients are
+    built and the TCP/TLS handshakes and SigV4 signing keys are done
+    before the first request. Each model has its own botocore client and
+    connection pool.
+    """
+    table_name = UserModel.Meta.table_name
+    calls = [model.exists for model in TABLE_MODELS]
+    calls.append(lambda: transaction_connection.describe_table(table_name))
+    calls.append(lambda: dynamodb_client.describe_table(TableName=table_name))
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        for future in [executor.submit(call) for call in calls]:
+            future.result()
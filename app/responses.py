@@ -0,0 +1,44 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+# Responses carry per-user fields (is_liked, ...) and need a bearer token,
+# so only the client itself may cache them
+PRIVATE_CACHE = "private, max-age=10"
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by pydantic-core's Rust serializer instead of the
+    stdlib json module. Output is the same compact UTF-8 JSON.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+def etag_for(content: Any) -> str:
+    return '"' + hashlib.blake2b(to_json(content), digest_size=16).hexdigest() + '"'
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    content: Any,
+    cache_control: str = PRIVATE_CACHE,
+) -> Optional[Response]:
+    """
+    Set Cache-Control and a content ETag on `response`. Returns a bodyless
+    304 to send instead when the client's If-None-Match already has it.
+    """
+    etag = etag_for(content)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = {tag.strip() for tag in if_none_match.split(",")}
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1 +1 @@
-from . import auth as auth, user as user, post as post, chat as chat, toggles as toggles
+from . import auth as auth, user as user, post as post, chat as chat, toggles as toggles, jobs as jobs
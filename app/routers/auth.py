@@ -1,17 +1,19 @@
 # app/routers/auth.py
 from fastapi import APIRouter, status, HTTPException
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
 import uuid
 from ..log_conf import logging
-from ..schemas import User, TokenResponse, UserLoginRequest, UserRegistrationRequest
+from ..schemas import TokenResponse, UserLoginRequest, UserRegistrationRequest
 from ..models import UserModel
-from ..dependencies import create_access_token
-from ..utils import verify_password, hash_password
+from ..dependencies import create_access_token_for_user
+from ..utils import verify_and_update_password, hash_password
+from ..cache import invalidate
+from .utils import build_user_payload, first_index_match
 
 # Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 
 router = APIRouter(tags=["Authentication"])
@@ -19,33 +21,49 @@ router = APIRouter(tags=["Authentication"])
 # Security
 
 
-async def authenticate_user(username: str, password: str) -> Optional[UserModel]:
-    """Authenticate user by username/email and password"""
+async def authenticate_user(
+    username: str, password: str
+) -> Tuple[Optional[UserModel], Optional[str]]:
+    """
+    Authenticate user by username/email and password. Also returns a new
+    password hash when the stored one is outdated, else None
+    """
     try:
-        # Try to find by username first
-        try:
-            user = next(UserModel.username_index.query(hash_key=username))
-        except StopIteration:
-            # Try to find by email
-            try:
-                user = next(UserModel.email_index.query(hash_key=username))
-            except StopIteration:
-                return None
-
-        if not verify_password(password, user.password):
-            return None
-
-        return user
+        # Emails always contain "@", so most logins need a single index query
+        if "@" in username:
+            indexes = [UserModel.email_index, UserModel.username_index]
+        else:
+            indexes = [UserModel.username_index]
+
+        match = None
+        for index in indexes:
+            match = await asyncio.to_thread(first_index_match, index, username)
+            if match:
+                break
+        if match is None:
+            return None, None
+        # The lookup indexes only project keys; load the full user row
+        user = await asyncio.to_thread(UserModel.get, match.user_id)
+
+        verified, new_hash = await asyncio.to_thread(
+            verify_and_update_password, password, user.password
+        )
+        if not verified:
+            return None, None
+
+        return user, new_hash
     except Exception as e:
         logger.error(f"Authentication error: {e}")
-        return None
+        return None, None
 
 
 @router.post("/login", response_model=TokenResponse)
 async def login_user(login_data: UserLoginRequest):
     """Login user and return JWT token"""
     try:
-        user = await authenticate_user(login_data.username, login_data.password)
+        user, new_hash = await authenticate_user(
+            login_data.username, login_data.password
+        )
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -58,26 +76,20 @@ async def login_user(login_data: UserLoginRequest):
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
             )
 
-        # Update last login
-        user.last_login = datetime.now(timezone.utc)
-        user.save()
+        # Update last login, plus the hash if it was rehashed under the
+        # current policy. A partial update, so concurrent counter ADDs on
+        # the row are not overwritten
+        actions = [UserModel.last_login.set(datetime.now(timezone.utc))]
+        if new_hash:
+            actions.append(UserModel.password.set(new_hash))
+        await asyncio.to_thread(user.update, actions=actions)
+        invalidate(UserModel, user.user_id)
 
         # Create access token
-        access_token = create_access_token(data={"sub": user.user_id})
+        access_token = create_access_token_for_user(user.user_id)
 
         # Return token and user info
-        user_dict = User(
-            user_id=user.user_id,
-            username=user.username,
-            email=user.email,
-            full_name=f"{user.first_name or ''} {user.last_name or ''}".strip(),
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            followers_count=user.followers_count,
-            following_count=user.following_count,
-            posts_count=user.posts_count,
-            created_at=user.created_at,
-        )
+        user_dict = build_user_payload(user)
 
         return TokenResponse(access_token=access_token, user=user_dict)
 
@@ -92,23 +104,19 @@ async def login_user(login_data: UserLoginRequest):
 async def register_user(user_data: UserRegistrationRequest):
     """Register a new user (SignupPageView equivalent)"""
     try:
-        # Check if username already exists
-        try:
-            _ = next(UserModel.username_index.query(hash_key=user_data.username))
+        # Check username and email availability concurrently
+        username_owner, email_owner = await asyncio.gather(
+            asyncio.to_thread(first_index_match, UserModel.username_index, user_data.username),
+            asyncio.to_thread(first_index_match, UserModel.email_index, user_data.email),
+        )
+        if username_owner:
             raise HTTPException(status_code=400, detail="Username already registered")
-        except StopIteration:
-            pass
-
-        # Check if email already exists
-        try:
-            _ = next(UserModel.email_index.query(hash_key=user_data.email))
+        if email_owner:
             raise HTTPException(status_code=400, detail="Email already registered")
-        except StopIteration:
-            pass
 
         # Create new user
         user_id = str(uuid.uuid4())
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await asyncio.to_thread(hash_password, user_data.password)
 
         user = UserModel(
             user_id=user_id,
@@ -117,31 +125,25 @@ async def register_user(user_data: UserRegistrationRequest):
             password=hashed_password,
             first_name=user_data.first_name,
             last_name=user_data.last_name,
+            full_name=UserModel.build_full_name(
+                user_data.first_name, user_data.last_name
+            ),
             bio=user_data.bio,
             is_active=True,
             created_at=datetime.now(timezone.utc),
         )
-        user.save()
+        await asyncio.to_thread(user.save)
 
         # Create access token
-        access_token = create_access_token(data={"sub": user_id})
+        access_token = create_access_token_for_user(user_id)
 
         # Return token and user info
-        user_dict = User(
-            user_id=user.user_id,
-            username=user.username,
-            email=user.email,
-            full_name=f"{user.first_name or ''} {user.last_name or ''}".strip(),
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            followers_count=0,
-            following_count=0,
-            posts_count=0,
-            created_at=user.created_at,
-        )
+        user_dict = build_user_payload(user)
 
         return TokenResponse(access_token=access_token, user=user_dict)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail="Registration failed")
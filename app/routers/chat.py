@@ -1,13 +1,16 @@
 from fastapi import APIRouter
 from ..log_conf import logging
+import asyncio
 import uuid
 from datetime import datetime, timezone
-from typing import List
-from fastapi import HTTPException, Depends, Path
+from typing import List, Optional
+from fastapi import HTTPException, Depends, Path, Query, Response
 from fastapi.responses import StreamingResponse
+from pynamodb.exceptions import PutError
 
 from ..dependencies import get_current_user_id
-from .utils import response_generator
+from ..cache import cached_get
+from .utils import response_generator, decode_cursor, query_page
 
 # Import our models
 from ..models import ChatConversationModel, ChatMessageModel
@@ -15,10 +18,22 @@ from ..schemas import ChatMessage, MessageRequest
 
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 router = APIRouter(prefix="/posts", tags=["Messages"])
 
+# Stop proxies (nginx, CDNs) from buffering the token stream
+STREAM_HEADERS = {"X-Accel-Buffering": "no", "Cache-Control": "no-cache"}
+
+
+def create_conversation_if_missing(conversation: ChatConversationModel):
+    try:
+        conversation.save(
+            condition=ChatConversationModel.conversation_id.does_not_exist()
+        )
+    except PutError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+
 
 @router.delete("/messages/{message_id}")
 async def delete_message(
@@ -26,16 +41,21 @@ async def delete_message(
 ):
     """Delete a chat message"""
     try:
-        message = ChatMessageModel.get(message_id)
+        message = await asyncio.to_thread(ChatMessageModel.get, message_id)
 
         # Check if user owns the conversation
-        conversation = ChatConversationModel.get(message.conversation_id)
+        # Ownership never changes, so a cached conversation is safe here
+        conversation = await asyncio.to_thread(
+            cached_get, ChatConversationModel, message.conversation_id
+        )
         if conversation.user_id != current_user_id:
             raise HTTPException(status_code=403, detail="Not authorized")
 
-        message.delete()
+        await asyncio.to_thread(message.delete)
         return {"message": "Message deleted successfully"}
 
+    except HTTPException:
+        raise
     except ChatMessageModel.DoesNotExist:
         raise HTTPException(status_code=404, detail="Message not found")
     except Exception as e:
@@ -45,32 +65,48 @@ async def delete_message(
 
 @router.get("/{post_id}/messages", response_model=List[ChatMessage])
 async def get_post_messages(
-    post_id: str = Path(...), current_user_id: str = Depends(get_current_user_id)
+    response: Response,
+    post_id: str = Path(...),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user_id: str = Depends(get_current_user_id),
 ):
-    """Get chat messages for a post"""
+    """Get chat messages for a post; pass `limit` to page through long histories"""
+    last_evaluated_key = decode_cursor(cursor)
     try:
         # Find or create conversation for this user and post
-        conversation_id = f"{post_id}#{current_user_id}"
-
-        try:
-            conversation = ChatConversationModel.get(conversation_id)
-        except ChatConversationModel.DoesNotExist:
-            # Create new conversation
-            conversation = ChatConversationModel(
-                conversation_id=conversation_id,
-                post_id=post_id,
-                user_id=current_user_id,
-                created_at=datetime.now(timezone.utc),
-                updated_at=datetime.now(timezone.utc),
+        conversation_id = post_id + "#" + current_user_id
+        now = datetime.now(timezone.utc)
+        conversation = ChatConversationModel(
+            conversation_id=conversation_id,
+            post_id=post_id,
+            user_id=current_user_id,
+            created_at=now,
+            updated_at=now,
+        )
+
+        def fetch_messages():
+            query = ChatMessageModel.conversation_messages_index.query
+            if limit is None:
+                # Ascending order by timestamp
+                return list(query(conversation_id, scan_index_forward=True)), None
+            return query_page(
+                query,
+                conversation_id,
+                limit,
+                last_evaluated_key,
+                scan_index_forward=True,
             )
-            conversation.save()
 
-        # Get messages
+        # Get messages while the conversation is ensured
+        _, (chat_messages, next_cursor) = await asyncio.gather(
+            asyncio.to_thread(create_conversation_if_missing, conversation),
+            asyncio.to_thread(fetch_messages),
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         messages = []
-        for message in ChatMessageModel.conversation_messages_index.query(
-            hash_key=conversation_id,
-            scan_index_forward=True,  # Ascending order by timestamp
-        ):
+        for message in chat_messages:
             messages.append(
                 ChatMessage(
                     message_id=message.message_id,
@@ -83,6 +119,8 @@ async def get_post_messages(
 
         return messages
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting messages for post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -96,19 +134,16 @@ async def post_message(
 ):
     """Post a message to chat with PDF"""
     try:
-        # Find or create conversation
-        conversation_id = f"{post_id}#{current_user_id}"
-        try:
-            conversation = ChatConversationModel.get(conversation_id)
-        except ChatConversationModel.DoesNotExist:
-            conversation = ChatConversationModel(
-                conversation_id=conversation_id,
-                post_id=post_id,
-                user_id=current_user_id,
-                created_at=datetime.now(timezone.utc),
-                updated_at=datetime.now(timezone.utc),
-            )
-            conversation.save()
+        # Create the conversation unless it exists; a conditional put replaces get-then-save
+        conversation_id = post_id + "#" + current_user_id
+        now = datetime.now(timezone.utc)
+        conversation = ChatConversationModel(
+            conversation_id=conversation_id,
+            post_id=post_id,
+            user_id=current_user_id,
+            created_at=now,
+            updated_at=now,
+        )
 
         # Create user message
         user_message = ChatMessageModel(
@@ -116,13 +151,18 @@ async def post_message(
             conversation_id=conversation_id,
             role="user",
             content=message_request.query,
-            timestamp=datetime.now(timezone.utc),
+            timestamp=now,
+        )
+        await asyncio.gather(
+            asyncio.to_thread(create_conversation_if_missing, conversation),
+            asyncio.to_thread(user_message.save),
         )
-        user_message.save()
 
-        chat_messages = list(
-            ChatMessageModel.conversation_messages_index.query(
-                hash_key=conversation_id, scan_index_forward=True, limit=10
+        chat_messages = await asyncio.to_thread(
+            lambda: list(
+                ChatMessageModel.conversation_messages_index.query(
+                    hash_key=conversation_id, scan_index_forward=True, limit=10
+                )
             )
         )
         messages = []
@@ -132,7 +172,9 @@ async def post_message(
             ]
 
         return StreamingResponse(
-            response_generator(post_id, messages, conversation), media_type="text/plain"
+            response_generator(post_id, messages, conversation),
+            media_type="text/event-stream",
+            headers=STREAM_HEADERS,
         )
 
     except Exception as e:
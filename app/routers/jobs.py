@@ -0,0 +1,42 @@
+import asyncio
+from fastapi import APIRouter
+from ..log_conf import logging
+from fastapi import HTTPException, Depends, Path
+
+from ..dependencies import get_current_user_id
+
+# Import our models
+from ..models import IngestJobModel
+from ..schemas import IngestJob
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}", response_model=IngestJob)
+async def get_job_status(
+    job_id: str = Path(...), current_user_id: str = Depends(get_current_user_id)
+):
+    """Get the status of a background post upload"""
+    try:
+        job = await asyncio.to_thread(IngestJobModel.get, job_id)
+    except IngestJobModel.DoesNotExist:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Jobs are private to the uploader
+    if job.user_id != current_user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return IngestJob(
+        job_id=job.job_id,
+        status=job.status,
+        post_id=job.post_id,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import uuid
 from datetime import datetime, timezone
@@ -12,17 +13,33 @@ from fastapi import (
     Path,
     BackgroundTasks,
     APIRouter,
+    Request,
+    Response,
 )
+from pynamodb.exceptions import DeleteError, UpdateError
 from ..config import settings
 from ..log_conf import logging
-from ..dependencies import get_current_user_id
+from ..dependencies import get_current_user_id, get_current_user
+from ..responses import not_modified
 from ..utils import delete_from_s3
+from ..cache import cached_get, cached_batch_get, invalidate
 from .utils import (
     get_post_by_id,
-    get_user_by_id,
+    get_cached_post,
+    build_user_payload,
+    build_post_payload,
+    POST_PAYLOAD_ATTRIBUTES,
+    get_public_page,
+    invalidate_public_pages,
+    smart_title,
+    adjust_counter,
+    save_counted_item,
     background_create_post,
+    enqueue_post_ingest,
     delete_embeddings,
     semantic_search,
+    decode_cursor,
+    query_page,
 )
 
 # Import our models
@@ -31,10 +48,14 @@ from ..models import (
     PostModel,
     CommentModel,
     FollowModel,
+    FeedModel,
+    IngestJobModel,
+    fan_out_post,
     get_current_user_context,
+    get_posts_context,
+    CONTEXT_LIKE,
 )
 from ..schemas import (
-    User,
     Post,
     BookUpdateRequest,
     Comment,
@@ -43,84 +64,84 @@ from ..schemas import (
 
 # Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
 # AWS clients (initialized once for Lambda container reuse)
 STAGE = settings.stage
 
 
 @router.get("/", response_model=List[Post])
 async def list_posts(
+    request: Request,
+    response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
     current_user_id: str = Depends(get_current_user_id),
 ):
-    """List public posts with pagination"""
+    """List public posts; page with `cursor` rather than `offset`"""
+    last_evaluated_key = decode_cursor(cursor)
+    if last_evaluated_key:
+        offset = 0
     try:
-        posts = []
-        # Query public posts using GSI
-        for post in PostModel.public_posts_index.query(
-            hash_key=1,
-            scan_index_forward=False,  # Descending order
-            limit=limit + offset,
-        ):
-            posts.append(post)
-
-        # Apply offset (DynamoDB doesn't have native offset support)
-        paginated_posts = posts[offset : offset + limit]
-
-        # Convert to response format with user context
+        # Query public posts using GSI. DynamoDB has no native offset, so
+        # offset rows are still read; the cursor resumes where a page ended.
+        # Pages without a cursor are the hot ones and come from a short cache
+        if last_evaluated_key:
+            posts, next_cursor = await asyncio.to_thread(
+                query_page,
+                PostModel.public_posts_index.query,
+                1,
+                offset + limit,
+                last_evaluated_key,
+                scan_index_forward=False,  # Descending order
+                attributes_to_get=POST_PAYLOAD_ATTRIBUTES,
+            )
+        else:
+            posts, next_cursor = await asyncio.to_thread(get_public_page, offset, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        paginated_posts = posts[offset:]
+        users_by_id, context = await asyncio.gather(
+            asyncio.to_thread(
+                cached_batch_get, UserModel, [post.user_id for post in paginated_posts]
+            ),
+            asyncio.to_thread(
+                get_posts_context,
+                current_user_id,
+                [post.post_id for post in paginated_posts],
+            ),
+        )
+
+        # Convert to response format with user context. Rows are plain dicts:
+        # FastAPI validates the page against response_model in one pass
         result = []
+        authors = {
+            user_id: build_user_payload(user) for user_id, user in users_by_id.items()
+        }
         for post in paginated_posts:
             # Get user info
-            try:
-                user = UserModel.get(post.user_id)
-                user_dict = User(
-                    user_id=user.user_id,
-                    username=user.username,
-                    email=user.email,
-                    full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                    bio=user.bio,
-                    avatar_url=user.avatar_url,
-                    followers_count=user.followers_count,
-                    following_count=user.following_count,
-                    posts_count=user.posts_count,
-                    created_at=user.created_at,
-                ).dict()
-
-                # Get context (is_liked)
-                context = get_current_user_context(
-                    current_user_id, post_id=post.post_id
-                )
-
-                post_dict = Post(
-                    id=post.post_id,
-                    user_id=post.user_id,
-                    user=user_dict,
-                    title=post.title,
-                    description=post.description,
-                    pdf_url=post.pdf_url,
-                    thumbnail_url=post.thumbnail_url,
-                    file_size=post.file_size,
-                    page_count=post.page_count,
-                    likes_count=post.likes_count,
-                    comments_count=post.comments_count,
-                    shares_count=post.shares_count,
-                    is_liked=context.get("is_liked", False),
-                    is_bookmarked=context.get("is_bookmarked", False),
-                    created_at=post.created_at,
-                    is_public=post.is_public == 1,
-                ).dict()
-
-                result.append(post_dict)
-
-            except UserModel.DoesNotExist:
+            user_dict = authors.get(post.user_id)
+            if user_dict is None:
                 logger.warning(f"User {post.user_id} not found for post {post.post_id}")
                 continue
 
-        return result
+            post_dict = build_post_payload(
+                post,
+                user_dict,
+                is_liked=post.post_id in context["is_liked"],
+                is_bookmarked=post.post_id in context["is_bookmarked"],
+            )
+
+            result.append(post_dict)
+
+        # 304 when the client already holds this page
+        return not_modified(request, response, result) or result
 
     except Exception as e:
         logger.error(f"Error listing posts: {e}")
@@ -128,62 +149,74 @@ async def list_posts(
 
 
 @router.get("/feed", response_model=List[Post])
-async def get_user_feed():
+async def get_user_feed(
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    current_user_id: str = Depends(get_current_user_id),
+):
     """Get personalized feed based on following"""
+    last_evaluated_key = decode_cursor(cursor)
+    if last_evaluated_key:
+        offset = 0
     try:
-
-        all_posts = PostModel.public_posts_index.query(
-            1,   
+        # One range read on the reader's materialized feed, newest first
+        entries, next_cursor = await asyncio.to_thread(
+            query_page,
+            FeedModel.query,
+            current_user_id,
+            offset + limit,
+            last_evaluated_key,
             scan_index_forward=False,
-            limit=50,  # Limit per user to prevent one user dominating feed
-        )       
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        post_ids = [entry.post_id for entry in entries[offset:]]
+
+        # Deleted posts and posts made private since the fan-out drop out here
+        posts_by_id = await asyncio.to_thread(cached_batch_get, PostModel, post_ids)
+        all_posts = [
+            post
+            for post in map(posts_by_id.get, post_ids)
+            if post is not None
+            and (post.is_public == 1 or post.user_id == current_user_id)
+        ]
+
+        users_by_id, context = await asyncio.gather(
+            asyncio.to_thread(
+                cached_batch_get, UserModel, [post.user_id for post in all_posts]
+            ),
+            asyncio.to_thread(
+                get_posts_context,
+                current_user_id,
+                [post.post_id for post in all_posts],
+            ),
+        )
 
         # Convert to response format
         result = []
+        authors = {
+            user_id: build_user_payload(user) for user_id, user in users_by_id.items()
+        }
         for post in all_posts:
-            try:
-                user = UserModel.get(post.user_id)
-
-                user_dict = User(
-                    user_id=user.user_id,
-                    username=user.username,
-                    email=user.email,
-                    full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                    bio=user.bio,
-                    avatar_url=user.avatar_url,
-                    followers_count=user.followers_count,
-                    following_count=user.following_count,
-                    posts_count=user.posts_count,
-                    created_at=user.created_at,
-                ).dict()
-
-                post_dict = Post(
-                    id=post.post_id,
-                    user_id=post.user_id,
-                    user=user_dict,
-                    title=post.title,
-                    description=post.description,
-                    pdf_url=post.pdf_url,
-                    thumbnail_url=post.thumbnail_url,
-                    file_size=post.file_size,
-                    page_count=post.page_count,
-                    likes_count=post.likes_count,
-                    comments_count=post.comments_count,
-                    shares_count=post.shares_count,
-                    is_liked=False,
-                    is_bookmarked= False,
-                    created_at=post.created_at,
-                ).dict()
-
-                result.append(post_dict)
-
-            except UserModel.DoesNotExist:
+            user_dict = authors.get(post.user_id)
+            if user_dict is None:
                 continue
 
+            post_dict = build_post_payload(
+                post,
+                user_dict,
+                is_liked=post.post_id in context["is_liked"],
+                is_bookmarked=post.post_id in context["is_bookmarked"],
+            )
+
+            result.append(post_dict)
+
         return result
 
     except Exception as e:
-        logger.error(f"Error getting feed for anonymous user: {e}")
+        logger.error(f"Error getting feed for user {current_user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -196,62 +229,50 @@ async def search_posts(
 ):
     """Search posts by title"""
     try:
-        # Note: DynamoDB doesn't have native text search
-        # You might want to use OpenSearch/Elasticsearch for better search
-        # For now, we'll do a scan with filter (not optimal for large datasets)
-
-        post_ids = semantic_search(q)
+        # Ranked by the vector index, so no table scan is needed
+        post_ids = await semantic_search(q)
         # Apply pagination
         paginated_post_ids = post_ids[offset : offset + limit]
 
-        posts = PostModel.batch_get(paginated_post_ids)
-        # Sort by creation date (newest first)
-        # posts = sorted(posts, key=lambda x: x.created_at, reverse=True)
+        # BatchGetItem returns items unordered; restore the ranking and
+        # hide other users' private posts
+        posts_by_id = await asyncio.to_thread(
+            cached_batch_get, PostModel, paginated_post_ids
+        )
+        posts = [
+            post
+            for post in map(posts_by_id.get, paginated_post_ids)
+            if post is not None
+            and (post.is_public == 1 or post.user_id == current_user_id)
+        ]
+        users_by_id, context = await asyncio.gather(
+            asyncio.to_thread(
+                cached_batch_get, UserModel, [post.user_id for post in posts]
+            ),
+            asyncio.to_thread(
+                get_posts_context,
+                current_user_id,
+                [post.post_id for post in posts],
+                CONTEXT_LIKE,
+            ),
+        )
 
         # Convert to response format
         result = []
+        authors = {
+            user_id: build_user_payload(user) for user_id, user in users_by_id.items()
+        }
         for post in posts:
-            try:
-                user = UserModel.get(post.user_id)
-                context = get_current_user_context(
-                    current_user_id, post_id=post.post_id
-                )
-
-                user_dict = User(
-                    user_id=user.user_id,
-                    username=user.username,
-                    email=user.email,
-                    full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                    bio=user.bio,
-                    avatar_url=user.avatar_url,
-                    followers_count=user.followers_count,
-                    following_count=user.following_count,
-                    posts_count=user.posts_count,
-                    created_at=user.created_at,
-                ).dict()
-
-                post_dict = Post(
-                    id=post.post_id,
-                    user_id=post.user_id,
-                    user=user_dict,
-                    title=post.title,
-                    description=post.description,
-                    pdf_url=post.pdf_url,
-                    thumbnail_url=post.thumbnail_url,
-                    file_size=post.file_size,
-                    page_count=post.page_count,
-                    likes_count=post.likes_count,
-                    comments_count=post.comments_count,
-                    shares_count=post.shares_count,
-                    is_liked=context.get("is_liked", False),
-                    created_at=post.created_at,
-                ).dict()
-
-                result.append(post_dict)
-
-            except UserModel.DoesNotExist:
+            user_dict = authors.get(post.user_id)
+            if user_dict is None:
                 continue
 
+            post_dict = build_post_payload(
+                post, user_dict, is_liked=post.post_id in context["is_liked"]
+            )
+
+            result.append(post_dict)
+
         return result
 
     except Exception as e:
@@ -277,26 +298,39 @@ async def create_post(
     if pdf_file.size > 5 * 1024 * 1024:  # 50MB limit
         raise HTTPException(status_code=400, detail="File size too large (max 5MB)")
 
+    # Check the magic bytes, not just the extension (readers allow a
+    # little leading junk before the header)
+    if PDF_MAGIC not in await pdf_file.read(PDF_HEADER_WINDOW):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    await pdf_file.seek(0)
+
     try:
-        pdf_content = await pdf_file.read()
 
         # Generate title if not provided
         if not title:
             filename = os.path.basename(pdf_file.filename)
-            title = os.path.splitext(filename)[0].title()
+            title = smart_title(os.path.splitext(filename)[0])
         else:
-            title = title.title()
-
-        background_tasks.add_task(
-            background_create_post,
-            pdf_content,
-            title,
-            is_public,
-            description,
-            current_user_id,
-        )
+            title = smart_title(title)
+
+        # Tracks progress so the client can poll GET /jobs/{job_id}
+        job = IngestJobModel(user_id=current_user_id, status="pending")
+        await asyncio.to_thread(job.save)
+
+        ingest_args = (title, is_public, description, current_user_id, job.job_id)
+        if settings.ingest_queue_url:
+            # Streamed to S3 from the spooled upload, then processed by the
+            # queue worker outside this request
+            await asyncio.to_thread(enqueue_post_ingest, pdf_file.file, *ingest_args)
+        else:
+            # The upload is closed before background tasks run, so read it now
+            pdf_content = await pdf_file.read()
+            background_tasks.add_task(
+                background_create_post, pdf_content, *ingest_args
+            )
         return {
-            "message": "Post creation is in progress. You will be notified shortly."
+            "message": "Post creation is in progress. You will be notified shortly.",
+            "job_id": job.job_id,
         }
     except Exception as e:
         logger.error(f"Error creating post: {e}")
@@ -305,46 +339,37 @@ async def create_post(
 
 @router.get("/{post_id}", response_model=Post)
 async def get_post_detail(
-    post_id: str = Path(...), current_user_id: str = Depends(get_current_user_id)
+    request: Request,
+    response: Response,
+    post_id: str = Path(...),
+    current_user_id: str = Depends(get_current_user_id),
 ):
     """Get post details"""
     try:
-        post = get_post_by_id(post_id)
-        user = get_user_by_id(post.user_id)
-
-        # Get context
-        context = get_current_user_context(current_user_id, post_id=post_id)
-
-        user_dict = User(
-            user_id=user.user_id,
-            username=user.username,
-            email=user.email,
-            full_name=f"{user.first_name or ''} {user.last_name or ''}",
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            followers_count=user.followers_count,
-            following_count=user.following_count,
-            posts_count=user.posts_count,
-            created_at=user.created_at,
-        ).dict()
-
-        return Post(
-            id=post.post_id,
-            user_id=post.user_id,
-            user=user_dict,
-            title=post.title,
-            description=post.description,
-            pdf_url=post.pdf_url,
-            thumbnail_url=post.thumbnail_url,
-            file_size=post.file_size,
-            page_count=post.page_count,
-            likes_count=post.likes_count,
-            comments_count=post.comments_count,
-            shares_count=post.shares_count,
-            is_liked=context.get("is_liked", False),
-            created_at=post.created_at,
+        # Display-only reads, served from the short-lived item caches
+        post, context = await asyncio.gather(
+            asyncio.to_thread(get_cached_post, post_id),
+            asyncio.to_thread(
+                get_current_user_context,
+                current_user_id,
+                post_id=post_id,
+                need=CONTEXT_LIKE,
+            ),
         )
+        try:
+            user = await asyncio.to_thread(cached_get, UserModel, post.user_id)
+        except UserModel.DoesNotExist:
+            raise HTTPException(status_code=404, detail="User not found")
 
+        user_dict = build_user_payload(user)
+
+        result = build_post_payload(
+            post, user_dict, is_liked=context.get("is_liked", False)
+        )
+        return not_modified(request, response, result) or result
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -354,61 +379,62 @@ async def get_post_detail(
 async def update_post(
     post_id: str = Path(...),
     update_data: BookUpdateRequest = None,
-    current_user_id: str = Depends(get_current_user_id),
+    current_user: UserModel = Depends(get_current_user),
 ):
     """Update a post"""
     try:
-        post = get_post_by_id(post_id)
+        # Only the changed attributes are written, so concurrent counter
+        # updates are not overwritten; ownership is checked by the write
+        actions = [PostModel.updated_at.set(datetime.now(timezone.utc))]
+        if update_data.title:
+            actions.append(PostModel.title.set(smart_title(update_data.title)))
+        if update_data.description is not None:
+            actions.append(PostModel.description.set(update_data.description))
+        if update_data.is_public is not None:
+            actions.append(
+                PostModel.is_public.set(1)
+                if update_data.is_public
+                else PostModel.is_public.remove()
+            )
 
-        # Check ownership
-        if post.user_id != current_user_id:
+        post = PostModel(post_id)
+        owned = PostModel.user_id == current_user.user_id
+        try:
+            made_public = False
+            if update_data.is_public:
+                # Tells a private -> public change (which must be fanned out
+                # to followers' feeds) apart from an already public post
+                try:
+                    await asyncio.to_thread(
+                        post.update,
+                        actions=actions,
+                        condition=owned & PostModel.is_public.does_not_exist(),
+                    )
+                    made_public = True
+                except UpdateError as e:
+                    if e.cause_response_code != "ConditionalCheckFailedException":
+                        raise
+            if not made_public:
+                await asyncio.to_thread(post.update, actions=actions, condition=owned)
+        except UpdateError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            await asyncio.to_thread(get_cached_post, post_id)  # 404 if missing
             raise HTTPException(
                 status_code=403, detail="Not authorized to update this post"
             )
+        invalidate(PostModel, post_id)
+        invalidate_public_pages()
+        if made_public:
+            await asyncio.to_thread(fan_out_post, post)
 
-        # Update fields
-        if update_data.title:
-            post.title = update_data.title.title()
-        if update_data.description is not None:
-            post.description = update_data.description
-        if update_data.is_public is not None:
-            post.is_public = int(update_data.is_public)
-
-        post.updated_at = datetime.now(timezone.utc)
-        post.save()
-
-        # Get user info for response
-        user = get_user_by_id(post.user_id)
-        user_dict = User(
-            user_id=user.user_id,
-            username=user.username,
-            email=user.email,
-            full_name=f"{user.first_name or ''} {user.last_name or ''}",
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            followers_count=user.followers_count,
-            following_count=user.following_count,
-            posts_count=user.posts_count,
-            created_at=user.created_at,
-        ).dict()
-
-        return Post(
-            id=post.post_id,
-            user_id=post.user_id,
-            user=user_dict,
-            title=post.title,
-            description=post.description,
-            pdf_url=post.pdf_url,
-            thumbnail_url=post.thumbnail_url,
-            file_size=post.file_size,
-            page_count=post.page_count,
-            likes_count=post.likes_count,
-            comments_count=post.comments_count,
-            shares_count=post.shares_count,
-            is_liked=False,
-            created_at=post.created_at,
-        )
+        # The owner is the current user, already loaded by the dependency
+        user_dict = build_user_payload(current_user)
+
+        return build_post_payload(post, user_dict, is_liked=False)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -420,7 +446,7 @@ async def delete_post(
 ):
     """Delete a post"""
     try:
-        post = get_post_by_id(post_id)
+        post = await asyncio.to_thread(get_post_by_id, post_id)
 
         # Check ownership
         if post.user_id != current_user_id:
@@ -428,19 +454,41 @@ async def delete_post(
                 status_code=403, detail="Not authorized to delete this post"
             )
 
-        # Delete from S3 (optional - you might want to keep files for backup)
-        delete_from_s3(key=post.pdf_url.split("/")[-1])
-
-        # Delete from DynamoDB
-        post.delete()
-        delete_embeddings(post.post_id)
-        # Update user's post count
-        user = get_user_by_id(current_user_id)
-        user.posts_count = max(0, user.posts_count - 1)
-        user.save()
+        # The item goes first and only once: a concurrent or retried delete
+        # finds it gone and stops before touching the file or the count
+        try:
+            await asyncio.to_thread(
+                post.delete, condition=PostModel.post_id.exists()
+            )
+        except DeleteError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            raise HTTPException(status_code=404, detail="Post not found")
+        invalidate(PostModel, post_id)
+        invalidate_public_pages()
+
+        # The post is gone for clients now; the file, the embeddings and
+        # the user's post count are cleaned up concurrently, and a failure
+        # there is logged rather than reported for a deleted post
+        cleanup = await asyncio.gather(
+            asyncio.to_thread(delete_from_s3, key=post.pdf_url.split("/")[-1]),
+            asyncio.to_thread(delete_embeddings, post.post_id),
+            asyncio.to_thread(
+                adjust_counter, UserModel(current_user_id), UserModel.posts_count, -1
+            ),
+            return_exceptions=True,
+        )
+        for step, outcome in zip(("file", "embeddings", "post count"), cleanup):
+            if isinstance(outcome, BaseException):
+                logger.error(
+                    f"Error removing {step} of deleted post {post_id}: {outcome}"
+                )
+        invalidate(UserModel, current_user_id)
 
         return {"message": "Post deleted successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -448,57 +496,56 @@ async def delete_post(
 
 @router.get("/{post_id}/comments", response_model=List[Comment])
 async def get_post_comments(
+    request: Request,
+    response: Response,
     post_id: str = Path(...),
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user_id: str = Depends(get_current_user_id),
 ):
-    """Get comments for a post"""
+    """Get comments for a post; page with `cursor` rather than `offset`"""
+    last_evaluated_key = decode_cursor(cursor)
+    if last_evaluated_key:
+        offset = 0
     try:
         comments = []
-        comment_count = 0
-
-        for comment in CommentModel.post_comments_index.query(
-            hash_key=post_id,
+        page, next_cursor = await asyncio.to_thread(
+            query_page,
+            CommentModel.post_comments_index.query,
+            post_id,
+            offset + limit,
+            last_evaluated_key,
             scan_index_forward=True,  # Oldest first
-            limit=limit + offset,
-        ):
-            if comment_count >= offset:
-                try:
-                    # Get user info for comment
-                    user = UserModel.get(comment.user_id)
-                    user_dict = User(
-                        user_id=user.user_id,
-                        username=user.username,
-                        email=user.email,
-                        full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                        bio=user.bio,
-                        avatar_url=user.avatar_url,
-                        followers_count=user.followers_count,
-                        following_count=user.following_count,
-                        posts_count=user.posts_count,
-                        created_at=user.created_at,
-                    ).dict()
-
-                    comment_dict = Comment(
-                        comment_id=comment.comment_id,
-                        post_id=comment.post_id,
-                        user_id=comment.user_id,
-                        user=user_dict,
-                        content=comment.content,
-                        created_at=comment.created_at,
-                    )
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        page = page[offset:]
+        users_by_id = await asyncio.to_thread(
+            cached_batch_get, UserModel, [comment.user_id for comment in page]
+        )
 
-                    comments.append(comment_dict)
+        authors = {
+            user_id: build_user_payload(user) for user_id, user in users_by_id.items()
+        }
+        for comment in page:
+            # Get user info for comment
+            user_dict = authors.get(comment.user_id)
+            if user_dict is None:
+                continue
 
-                except UserModel.DoesNotExist:
-                    continue
+            comment_dict = {
+                "comment_id": comment.comment_id,
+                "post_id": comment.post_id,
+                "user_id": comment.user_id,
+                "user": user_dict,
+                "content": comment.content,
+                "created_at": comment.created_at,
+            }
 
-            comment_count += 1
-            if len(comments) >= limit:
-                break
+            comments.append(comment_dict)
 
-        return comments
+        return not_modified(request, response, comments) or comments
 
     except Exception as e:
         logger.error(f"Error getting comments for post {post_id}: {e}")
@@ -509,51 +556,39 @@ async def get_post_comments(
 async def create_comment(
     post_id: str = Path(...),
     content: str = Form(..., min_length=1, max_length=1000),
-    current_user_id: str = Depends(get_current_user_id),
+    current_user: UserModel = Depends(get_current_user),
 ):
     """Create a comment on a post"""
     try:
-        # Verify post exists
-        post = get_post_by_id(post_id)
-
-        # Create comment
         comment = CommentModel(
             comment_id=str(uuid.uuid4()),
             post_id=post_id,
-            user_id=current_user_id,
+            user_id=current_user.user_id,
             content=content.strip(),
             created_at=datetime.now(timezone.utc),
         )
-        comment.save()
-
-        # Update post comment count
-        post.comments_count += 1
-        post.save()
-
-        # Get user info for response
-        user = get_user_by_id(current_user_id)
-        user_dict = User(
-            user_id=user.user_id,
-            username=user.username,
-            email=user.email,
-            full_name=f"{user.first_name or ''} {user.last_name or ''}",
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            followers_count=user.followers_count,
-            following_count=user.following_count,
-            posts_count=user.posts_count,
-            created_at=user.created_at,
-        ).dict()
-
-        return Comment(
-            comment_id=comment.comment_id,
-            post_id=comment.post_id,
-            user_id=comment.user_id,
-            user=user_dict,
-            content=comment.content,
-            created_at=comment.created_at,
+        # Save the comment and bump the post's count together; the count's
+        # presence doubles as the check that the post exists
+        saved = await asyncio.to_thread(
+            save_counted_item, comment, PostModel(post_id), PostModel.comments_count
         )
+        if not saved:
+            raise HTTPException(status_code=404, detail="Post not found")
+        invalidate(PostModel, post_id)
+
+        # A plain dict: FastAPI validates it against response_model once,
+        # where a Comment instance would be validated twice
+        return {
+            "comment_id": comment.comment_id,
+            "post_id": comment.post_id,
+            "user_id": comment.user_id,
+            "user": build_user_payload(current_user),
+            "content": comment.content,
+            "created_at": comment.created_at,
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating comment on post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
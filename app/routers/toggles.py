@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter
 from ..log_conf import logging
 from datetime import datetime, timezone
@@ -5,16 +6,30 @@ from fastapi import (
     HTTPException,
     Depends,
     Path,
+    BackgroundTasks,
 )
 from ..dependencies import get_current_user_id
-from .utils import get_post_by_id, get_user_by_id
+from .utils import (
+    get_post_by_id,
+    toggle_item,
+    toggle_counted_item,
+    invalidate_public_pages,
+)
+from ..cache import invalidate
 
 # Import our models
-from ..models import LikeModel, BookmarkModel, FollowModel
+from ..models import (
+    UserModel,
+    PostModel,
+    LikeModel,
+    BookmarkModel,
+    FollowModel,
+    fan_out_post,
+    sync_feed_after_follow,
+)
 
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 post_router = APIRouter(prefix="/posts", tags=["Toggles"])
 
@@ -23,49 +38,39 @@ user_router = APIRouter(prefix="/users", tags=["Toggles"])
 
 @user_router.post("/{user_id}/follow")
 async def toggle_follow(
-    user_id: str = Path(...), current_user_id: str = Depends(get_current_user_id)
+    background_tasks: BackgroundTasks,
+    user_id: str = Path(...),
+    current_user_id: str = Depends(get_current_user_id),
 ):
     """Follow or unfollow a user (follow function equivalent)"""
     try:
         if user_id == current_user_id:
             raise HTTPException(status_code=400, detail="Cannot follow yourself")
 
-        # Check if target user exists
-        target_user = get_user_by_id(user_id)
-        current_user = get_user_by_id(current_user_id)
-
-        relationship_id = FollowModel.create_relationship_id(current_user_id, user_id)
-
-        try:
-            # Check if already following
-            existing_follow = FollowModel.get(relationship_id)
-            # Unfollow
-            existing_follow.delete()
-            # Update counts
-            current_user.following_count = max(0, current_user.following_count - 1)
-            target_user.followers_count = max(0, target_user.followers_count - 1)
-
-            is_following = False
-
-        except FollowModel.DoesNotExist:
-            # Follow
-            follow = FollowModel(
-                relationship_id=relationship_id,
-                follower_id=current_user_id,
-                following_id=user_id,
-                created_at=datetime.now(timezone.utc),
-            )
-            follow.save()
-
-            # Update counts
-            current_user.following_count += 1
-            target_user.followers_count += 1
-
-            is_following = True
-
-        # Save updated counts
-        current_user.save()
-        target_user.save()
+        follow = FollowModel(
+            relationship_id=FollowModel.create_relationship_id(current_user_id, user_id),
+            follower_id=current_user_id,
+            following_id=user_id,
+            created_at=datetime.now(timezone.utc),
+        )
+        # Follow, or unfollow if already following, together with both
+        # users' counts; nothing is written if the target user is missing
+        target_user = UserModel(user_id)
+        current_user = UserModel(current_user_id)
+        is_following = await asyncio.to_thread(
+            toggle_counted_item,
+            follow,
+            FollowModel.relationship_id,
+            (target_user, UserModel.followers_count),
+            (current_user, UserModel.following_count),
+        )
+        if is_following is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        invalidate(UserModel, current_user_id)
+        invalidate(UserModel, user_id)
+        background_tasks.add_task(
+            sync_feed_after_follow, current_user_id, user_id, is_following
+        )
 
         return {
             "following": is_following,  # Match your Django template variable name
@@ -73,6 +78,8 @@ async def toggle_follow(
             "following_count": current_user.following_count,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error following user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -84,32 +91,25 @@ async def toggle_like(
 ):
     """Toggle like on a post"""
     try:
-        post = get_post_by_id(post_id)
-        like_id = LikeModel.create_like_id(post_id, current_user_id)
-
-        try:
-            # Check if already liked
-            existing_like = LikeModel.get(like_id)
-            # Unlike
-            existing_like.delete()
-            post.likes_count = max(0, post.likes_count - 1)
-            is_liked = False
-        except LikeModel.DoesNotExist:
-            # Like
-            like = LikeModel(
-                like_id=like_id,
-                post_id=post_id,
-                user_id=current_user_id,
-                created_at=datetime.now(timezone.utc),
-            )
-            like.save()
-            post.likes_count += 1
-            is_liked = True
-
-        post.save()
+        like = LikeModel(
+            like_id=LikeModel.create_like_id(post_id, current_user_id),
+            post_id=post_id,
+            user_id=current_user_id,
+            created_at=datetime.now(timezone.utc),
+        )
+        # Like, or unlike if already liked, together with the post's count
+        post = PostModel(post_id)
+        is_liked = await asyncio.to_thread(
+            toggle_counted_item, like, LikeModel.like_id, (post, PostModel.likes_count)
+        )
+        if is_liked is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        invalidate(PostModel, post_id)
 
         return {"is_liked": is_liked, "likes_count": post.likes_count}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error toggling like for post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -121,25 +121,17 @@ async def toggle_bookmark(
 ):
     """Toggle bookmark on a post"""
     try:
-        _ = get_post_by_id(post_id)
-        bookmark_id = BookmarkModel.create_bookmark_id(post_id, current_user_id)
-
-        try:
-            # Check if already bookmarked
-            existing_bookmark = BookmarkModel.get(bookmark_id)
-            # Unbookmark
-            existing_bookmark.delete()
-            is_bookmarked = False
-        except BookmarkModel.DoesNotExist:
-            # Bookmark
-            bookmark = BookmarkModel(
-                bookmark_id=bookmark_id,
-                post_id=post_id,
-                user_id=current_user_id,
-                created_at=datetime.now(timezone.utc),
-            )
-            bookmark.save()
-            is_bookmarked = True
+        bookmark = BookmarkModel(
+            bookmark_id=BookmarkModel.create_bookmark_id(post_id, current_user_id),
+            post_id=post_id,
+            user_id=current_user_id,
+            created_at=datetime.now(timezone.utc),
+        )
+        # Bookmark, or unbookmark if already bookmarked. The post is not read
+        # first; bookmarks of deleted posts are skipped when listed
+        is_bookmarked = await asyncio.to_thread(
+            toggle_item, bookmark, BookmarkModel.bookmark_id
+        )
 
         return {"is_bookmarked": is_bookmarked}
 
@@ -154,18 +146,33 @@ async def toggle_post_visibility(
 ):
     """Toggle post public/private visibility"""
     try:
-        post = get_post_by_id(post_id)
+        post = await asyncio.to_thread(get_post_by_id, post_id)
 
         # Check ownership
         if post.user_id != current_user_id:
             raise HTTPException(status_code=403, detail="Not authorized")
 
-        post.is_public = int(not (post.is_public == 1))
-        post.updated_at = datetime.now(timezone.utc)
-        post.save()
+        # Partial update: a full save would overwrite concurrent counter updates
+        await asyncio.to_thread(
+            post.update,
+            actions=[
+                PostModel.is_public.remove()
+                if post.is_public == 1
+                else PostModel.is_public.set(1),
+                PostModel.updated_at.set(datetime.now(timezone.utc)),
+            ],
+        )
+        invalidate(PostModel, post_id)
+        invalidate_public_pages()
+        # Feeds are filled on write; made public now, it reaches followers
+        # here (made private, feed reads filter it out)
+        if post.is_public == 1:
+            await asyncio.to_thread(fan_out_post, post)
 
         return {"is_public": post.is_public == 1}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error toggling visibility for post {post_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,50 +1,78 @@
 from ..log_conf import logging
+import asyncio
 import uuid
 from typing import List, Optional
-from fastapi import HTTPException, Depends, UploadFile, File, Query, Path, Form
-from ..dependencies import get_current_user_id
+from fastapi import (
+    HTTPException,
+    Depends,
+    UploadFile,
+    File,
+    Query,
+    Path,
+    Form,
+    Request,
+    Response,
+)
+from ..dependencies import (
+    get_current_user_id,
+    get_current_user,
+    get_current_active_user,
+)
 from fastapi import APIRouter
 
 # Import our models
-from ..models import UserModel, FollowModel, get_current_user_context, BookmarkModel
-from ..schemas import User, UserUpdateRequest, Post
+from ..models import (
+    UserModel,
+    FollowModel,
+    get_current_user_context,
+    get_following_context,
+    get_posts_context,
+    BookmarkModel,
+    CONTEXT_FOLLOW,
+    CONTEXT_LIKE,
+)
+from ..responses import not_modified
+from ..schemas import AvatarUploadResponse, User, UserUpdateRequest, Post
 from ..models import PostModel
-from ..utils import upload_to_s3
-from .utils import get_user_by_id
+from ..utils import presign_s3_upload, s3_url, upload_to_s3
+from ..cache import cached_batch_get, invalidate
+from .utils import (
+    get_cached_user,
+    build_user_payload,
+    build_post_payload,
+    first_index_match,
+    POST_PAYLOAD_ATTRIBUTES,
+    decode_cursor,
+    query_page,
+)
 # Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+AVATAR_MAX_SIZE = 5 * 1024 * 1024  # 5MB
+AVATAR_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png"}
+AVATAR_FILE_EXTENSIONS = frozenset({"jpg", "jpeg", "png"})
+
 # AWS clients (initialized once for Lambda container reuse)
 
 
 @router.get("/me", response_model=User)
 async def get_current_user_info(
-    current_user_id: UserModel = Depends(get_current_user_id),
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_user),
 ):
     """Get current user information"""
-    current_user = get_user_by_id(current_user_id)
-    return User(
-        user_id=current_user.user_id,
-        username=current_user.username,
-        email=current_user.email,
-        full_name=f"{current_user.first_name or ''} {current_user.last_name or ''}".strip(),
-        bio=current_user.bio,
-        avatar_url=current_user.avatar_url,
-        followers_count=current_user.followers_count,
-        following_count=current_user.following_count,
-        posts_count=current_user.posts_count,
-        created_at=current_user.created_at,
-    )
+    result = build_user_payload(current_user)
+    return not_modified(request, response, result) or result
 
 
 @router.put("/profile", response_model=User)
 async def update_user_profile(
     update_data: Optional[str] = Form(None),
     avatar_file: Optional[UploadFile] = File(None),
-    current_user_id: UserModel = Depends(get_current_user_id),
+    current_user: UserModel = Depends(get_current_active_user),
 ):
     """Update user profile"""
 
@@ -52,77 +80,85 @@ async def update_user_profile(
         update_data = UserUpdateRequest.model_validate_json(update_data)
 
     try:
-        current_user = get_user_by_id(current_user_id)
+        # Only changed attributes are written, so a profile edit cannot
+        # overwrite follower/post counters updated in the meantime
+        actions = []
+
         # Handle avatar upload if provided
         if avatar_file:
-            if not avatar_file.filename.lower().endswith((".jpg", ".jpeg", ".png")):
+            _, dot, extension = avatar_file.filename.rpartition(".")
+            if not dot or extension.lower() not in AVATAR_FILE_EXTENSIONS:
                 raise HTTPException(
                     status_code=400,
                     detail="Only JPG, JPEG, PNG files are allowed for avatar",
                 )
 
-            if avatar_file.size > 5 * 1024 * 1024:  # 5MB limit
+            if avatar_file.size > AVATAR_MAX_SIZE:
                 raise HTTPException(
                     status_code=400, detail="Avatar file size too large (max 5MB)"
                 )
 
-            # Upload avatar to S3
-            avatar_content = await avatar_file.read()
+            # Stream the spooled upload to S3 instead of reading it into memory
             avatar_key = f"avatars/{current_user.user_id}_{uuid.uuid4()}.jpg"
-            avatar_url = upload_to_s3(avatar_content, avatar_key, "image/jpeg")
-            current_user.avatar_url = avatar_url
+            avatar_url = await asyncio.to_thread(
+                upload_to_s3, avatar_file.file, avatar_key, "image/jpeg"
+            )
+            actions.append(UserModel.avatar_url.set(avatar_url))
 
         # Update user fields
         if update_data:
-            if update_data.username:
-                # Check if username is already taken by another user
-                try:
-                    existing_user = next(
-                        UserModel.username_index.query(hash_key=update_data.username)
-                    )
-                    if existing_user.user_id != current_user.user_id:
-                        raise HTTPException(
-                            status_code=400, detail="Username already taken"
-                        )
-                except StopIteration:
-                    pass
-                current_user.username = update_data.username
-
-            if update_data.email:
-                # Check if email is already taken by another user
-                try:
-                    existing_user = next(
-                        UserModel.email_index.query(hash_key=update_data.email)
+            # Uniqueness checks for changed username/email, run concurrently
+            checks = []
+            if update_data.username and update_data.username != current_user.username:
+                checks.append(
+                    (UserModel.username_index, update_data.username, "Username")
+                )
+                actions.append(UserModel.username.set(update_data.username))
+            if update_data.email and update_data.email != current_user.email:
+                checks.append((UserModel.email_index, update_data.email, "Email"))
+                actions.append(UserModel.email.set(update_data.email))
+            existing_users = await asyncio.gather(
+                *(
+                    asyncio.to_thread(first_index_match, index, value)
+                    for index, value, _ in checks
+                )
+            )
+            for existing_user, (_, _, field) in zip(existing_users, checks):
+                if existing_user and existing_user.user_id != current_user.user_id:
+                    raise HTTPException(
+                        status_code=400, detail=f"{field} already taken"
                     )
-                    if existing_user.user_id != current_user.user_id:
-                        raise HTTPException(
-                            status_code=400, detail="Email already taken"
-                        )
-                except StopIteration:
-                    pass
-                current_user.email = update_data.email
 
+            first_name, last_name = current_user.first_name, current_user.last_name
             if update_data.first_name is not None:
-                current_user.first_name = update_data.first_name
+                first_name = update_data.first_name
+                actions.append(UserModel.first_name.set(first_name))
             if update_data.last_name is not None:
-                current_user.last_name = update_data.last_name
+                last_name = update_data.last_name
+                actions.append(UserModel.last_name.set(last_name))
+            if update_data.first_name is not None or update_data.last_name is not None:
+                actions.append(
+                    UserModel.full_name.set(
+                        UserModel.build_full_name(first_name, last_name)
+                    )
+                )
             if update_data.bio is not None:
-                current_user.bio = update_data.bio
-
-        current_user.save()
-
-        return User(
-            user_id=current_user.user_id,
-            username=current_user.username,
-            email=current_user.email,
-            full_name=f"{current_user.first_name or ''} {current_user.last_name or ''}".strip(),
-            bio=current_user.bio,
-            avatar_url=current_user.avatar_url,
-            followers_count=current_user.followers_count,
-            following_count=current_user.following_count,
-            posts_count=current_user.posts_count,
-            created_at=current_user.created_at,
-        )
+                actions.append(UserModel.bio.set(update_data.bio))
+
+            if update_data.avatar_url is not None and not avatar_file:
+                # Only an object this user was given an upload URL for
+                if not update_data.avatar_url.startswith(
+                    s3_url(f"avatars/{current_user.user_id}_")
+                ):
+                    raise HTTPException(status_code=400, detail="Invalid avatar URL")
+                actions.append(UserModel.avatar_url.set(update_data.avatar_url))
+
+        if actions:
+            # Refreshes current_user with the stored item
+            await asyncio.to_thread(current_user.update, actions=actions)
+            invalidate(UserModel, current_user.user_id)
+
+        return build_user_payload(current_user)
 
     except HTTPException:
         raise
@@ -131,85 +167,126 @@ async def update_user_profile(
         raise HTTPException(status_code=500, detail="Profile update failed")
 
 
+@router.post("/profile/avatar-upload", response_model=AvatarUploadResponse)
+async def create_avatar_upload(
+    content_type: str = Query("image/jpeg"),
+    current_user_id: str = Depends(get_current_user_id),
+):
+    """
+    Presigned S3 POST for uploading an avatar directly from the client,
+    without sending the file through this API. Once the upload succeeds,
+    set the returned avatar_url with PUT /users/profile.
+    """
+    extension = AVATAR_EXTENSIONS.get(content_type)
+    if extension is None:
+        raise HTTPException(
+            status_code=400, detail="Only JPG, JPEG, PNG files are allowed for avatar"
+        )
+    avatar_key = f"avatars/{current_user_id}_{uuid.uuid4()}.{extension}"
+    upload = await asyncio.to_thread(
+        presign_s3_upload, avatar_key, content_type, AVATAR_MAX_SIZE
+    )
+    return {
+        "upload_url": upload["url"],
+        "fields": upload["fields"],
+        "avatar_url": s3_url(avatar_key),
+    }
+
+
 @router.get("/{user_id}/profile", response_model=User)
 async def get_user_profile(
     user_id: str = Path(...), current_user_id: str = Depends(get_current_user_id)
 ):
     """Get user profile with posts and stats"""
     try:
-        user = get_user_by_id(user_id)
-
-        # Get follow context
-        context = get_current_user_context(current_user_id, target_user_id=user_id)
-
-        user = User(
-            user_id=user.user_id,
-            username=user.username,
-            email=user.email,
-            full_name=f"{user.first_name or ''} {user.last_name or ''}",
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            followers_count=user.followers_count,
-            following_count=user.following_count,
-            posts_count=user.posts_count,
-            is_following=context.get("is_following", False),
-            created_at=user.created_at,
+        # The user and the follow context are independent reads
+        user, context = await asyncio.gather(
+            asyncio.to_thread(get_cached_user, user_id),
+            asyncio.to_thread(
+                get_current_user_context,
+                current_user_id,
+                target_user_id=user_id,
+                need=CONTEXT_FOLLOW,
+            ),
         )
 
-        return user
+        return build_user_payload(
+            user, is_following=context.get("is_following", False)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting profile for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+async def _follow_page(
+    index,
+    user_id: str,
+    offset: int,
+    limit: int,
+    last_evaluated_key: Optional[dict],
+    response: Response,
+) -> List[FollowModel]:
+    """
+    One page of a follow index, newest first. With a cursor DynamoDB
+    resumes where the last page ended; `offset` still reads the skipped rows.
+    """
+    follows, next_cursor = await asyncio.to_thread(
+        query_page,
+        index.query,
+        user_id,
+        offset + limit,
+        last_evaluated_key,
+        scan_index_forward=False,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return follows[offset:]
+
+
+async def _build_user_list(current_user_id: str, user_ids: List[str]) -> List[dict]:
+    """
+    User payloads in the given order with is_following, from one batch read
+    of the users and one of the follow rows; missing users are skipped
+    """
+    users_by_id, followed = await asyncio.gather(
+        asyncio.to_thread(cached_batch_get, UserModel, user_ids),
+        asyncio.to_thread(get_following_context, current_user_id, user_ids),
+    )
+    return [
+        build_user_payload(user, is_following=user.user_id in followed)
+        for user in map(users_by_id.get, user_ids)
+        if user is not None
+    ]
+
+
 @router.get("/{user_id}/followers", response_model=List[User])
 async def get_user_followers(
+    request: Request,
+    response: Response,
     user_id: str = Path(...),
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user_id: str = Depends(get_current_user_id),
 ):
     """Get user's followers"""
+    last_evaluated_key = decode_cursor(cursor)
+    if last_evaluated_key:
+        offset = 0
     try:
-        followers = []
-        count = 0
-
-        for follow in FollowModel.following_index.query(
-            hash_key=user_id,
-            scan_index_forward=False,  # Newest first
-            limit=limit + offset,
-        ):
-            if count >= offset:
-                try:
-                    user = UserModel.get(follow.follower_id)
-                    context = get_current_user_context(
-                        current_user_id, target_user_id=user.user_id
-                    )
-
-                    user_dict = User(
-                        user_id=user.user_id,
-                        username=user.username,
-                        email=user.email,
-                        full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                        bio=user.bio,
-                        avatar_url=user.avatar_url,
-                        followers_count=user.followers_count,
-                        following_count=user.following_count,
-                        posts_count=user.posts_count,
-                        is_following=context.get("is_following", False),
-                        created_at=user.created_at,
-                    )
-
-                    followers.append(user_dict)
-
-                except UserModel.DoesNotExist:
-                    continue
-
-            count += 1
-            if len(followers) >= limit:
-                break
-
-        return followers
+        follows = await _follow_page(
+            FollowModel.following_index,
+            user_id,
+            offset,
+            limit,
+            last_evaluated_key,
+            response,
+        )
+        user_ids = [follow.follower_id for follow in follows]
+        result = await _build_user_list(current_user_id, user_ids)
+        return not_modified(request, response, result) or result
 
     except Exception as e:
         logger.error(f"Error getting followers for user {user_id}: {e}")
@@ -218,52 +295,30 @@ async def get_user_followers(
 
 @router.get("/{user_id}/following", response_model=List[User])
 async def get_user_following(
+    request: Request,
+    response: Response,
     user_id: str = Path(...),
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user_id: str = Depends(get_current_user_id),
 ):
     """Get users that this user is following"""
+    last_evaluated_key = decode_cursor(cursor)
+    if last_evaluated_key:
+        offset = 0
     try:
-        following = []
-        count = 0
-
-        for follow in FollowModel.follower_index.query(
-            hash_key=user_id,
-            scan_index_forward=False,  # Newest first
-            limit=limit + offset,
-        ):
-            if count >= offset:
-                try:
-                    user = UserModel.get(follow.following_id)
-                    context = get_current_user_context(
-                        current_user_id, target_user_id=user.user_id
-                    )
-
-                    user_dict = User(
-                        user_id=user.user_id,
-                        username=user.username,
-                        email=user.email,
-                        full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                        bio=user.bio,
-                        avatar_url=user.avatar_url,
-                        followers_count=user.followers_count,
-                        following_count=user.following_count,
-                        posts_count=user.posts_count,
-                        is_following=context.get("is_following", False),
-                        created_at=user.created_at,
-                    )
-
-                    following.append(user_dict)
-
-                except UserModel.DoesNotExist:
-                    continue
-
-            count += 1
-            if len(following) >= limit:
-                break
-
-        return following
+        follows = await _follow_page(
+            FollowModel.follower_index,
+            user_id,
+            offset,
+            limit,
+            last_evaluated_key,
+            response,
+        )
+        user_ids = [follow.following_id for follow in follows]
+        result = await _build_user_list(current_user_id, user_ids)
+        return not_modified(request, response, result) or result
 
     except Exception as e:
         logger.error(f"Error getting following for user {user_id}: {e}")
@@ -280,42 +335,39 @@ async def get_user_posts(
     """Get user profile with posts and stats"""
     try:
         # Get user's posts
-        posts = []
         query_filter = None
         if user_id != current_user_id:
             # Show only public posts for other users
             query_filter = PostModel.is_public == 1
-        all_posts = PostModel.user_posts_index.query(
-            hash_key=user_id,
-            scan_index_forward=False,  # Newest first
-            filter_condition=query_filter,
+        all_posts = await asyncio.to_thread(
+            lambda: list(
+                PostModel.user_posts_index.query(
+                    hash_key=user_id,
+                    scan_index_forward=False,  # Newest first
+                    filter_condition=query_filter,
+                    # Stop paging once the requested window is filled
+                    limit=offset + limit,
+                    attributes_to_get=POST_PAYLOAD_ATTRIBUTES,
+                )
+            )
+        )
+        paginated_posts = all_posts[offset : offset + limit]
+
+        # Likes and bookmarks for the whole page in one batch read
+        context = await asyncio.to_thread(
+            get_posts_context,
+            current_user_id,
+            [post.post_id for post in paginated_posts],
         )
-        paginated_posts = list(all_posts)[offset : offset + limit]
-
-        for post in paginated_posts:
-            context = get_current_user_context(current_user_id, post_id=post.post_id)
-
-            post_dict = Post(
-                id=post.post_id,
-                user_id=post.user_id,
-                title=post.title,
-                description=post.description,
-                pdf_url=post.pdf_url,
-                thumbnail_url=post.thumbnail_url,
-                file_size=post.file_size,
-                page_count=post.page_count,
-                likes_count=post.likes_count,
-                comments_count=post.comments_count,
-                shares_count=post.shares_count,
-                is_liked=context.get("is_liked", False),
-                is_bookmarked=context.get("is_bookmarked", False),
-                created_at=post.created_at,
-                is_public=post.is_public == 1,
-            ).model_dump()
-
-            posts.append(post_dict)
-
-        return posts
+
+        return [
+            build_post_payload(
+                post,
+                is_liked=post.post_id in context["is_liked"],
+                is_bookmarked=post.post_id in context["is_bookmarked"],
+            )
+            for post in paginated_posts
+        ]
 
     except Exception as e:
         logger.error(f"Error getting profile for user {user_id}: {e}")
@@ -324,84 +376,72 @@ async def get_user_posts(
 
 @router.get("/{user_id}/bookmarks", response_model=List[Post])
 async def get_user_bookmarks(
+    response: Response,
     user_id: str = Path(...),
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user_id: str = Depends(get_current_user_id),
 ):
-    """Get user's bookmarked posts"""
+    """Get user's bookmarked posts, newest bookmark first"""
+    # For privacy, only allow users to see their own bookmarks
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=403, detail="You can only view your own bookmarks."
+        )
+    last_evaluated_key = decode_cursor(cursor)
+    if last_evaluated_key:
+        offset = 0
     try:
-        # For privacy, only allow users to see their own bookmarks
-        if user_id != current_user_id:
-            raise HTTPException(
-                status_code=403, detail="You can only view your own bookmarks."
-            )
-
-        # 1. Get all bookmark items for the user
-        all_bookmarks = list(BookmarkModel.user_bookmarks_index.query(hash_key=user_id))
-
-        # 2. Sort bookmarks by creation date (newest first)
-        all_bookmarks.sort(key=lambda b: b.created_at, reverse=True)
-
-        # 3. Apply pagination to the list of bookmark items
-        paginated_bookmarks = all_bookmarks[offset : offset + limit]
+        # The index is sorted by created_at, so DynamoDB returns the page
+        # already ordered and stops reading once it is filled
+        bookmarks, next_cursor = await asyncio.to_thread(
+            query_page,
+            BookmarkModel.user_bookmarks_index.query,
+            user_id,
+            offset + limit,
+            last_evaluated_key,
+            scan_index_forward=False,  # Newest first
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        post_ids = [bookmark.post_id for bookmark in bookmarks[offset:]]
+
+        # Posts in one batch read; bookmarks of deleted posts are skipped
+        posts_by_id = await asyncio.to_thread(cached_batch_get, PostModel, post_ids)
+        posts = [post for post in map(posts_by_id.get, post_ids) if post is not None]
+        users_by_id, context = await asyncio.gather(
+            asyncio.to_thread(
+                cached_batch_get, UserModel, [post.user_id for post in posts]
+            ),
+            asyncio.to_thread(
+                get_posts_context,
+                current_user_id,
+                [post.post_id for post in posts],
+                CONTEXT_LIKE,
+            ),
+        )
 
-        # 4. Fetch the full post details for the paginated bookmarks
-        posts = []
-        for bookmark in paginated_bookmarks:
-            try:
-                post = PostModel.get(bookmark.post_id)
-                user = UserModel.get(post.user_id)
+        result = []
+        authors = {
+            user_id: build_user_payload(user) for user_id, user in users_by_id.items()
+        }
+        for post in posts:
+            user_dict = authors.get(post.user_id)
+            if user_dict is None:
+                logger.warning(f"User for post {post.post_id} not found, skipping.")
+                continue
 
-                # Get context for the post (e.g., is_liked by the current user)
-                context = get_current_user_context(
-                    current_user_id, post_id=post.post_id
-                )
+            post_dict = build_post_payload(
+                post,
+                user_dict,
+                is_liked=post.post_id in context["is_liked"],
+                is_bookmarked=True,  # Always true since we are fetching bookmarks
+            )
 
-                user_dict = User(
-                    user_id=user.user_id,
-                    username=user.username,
-                    email=user.email,
-                    full_name=f"{user.first_name or ''} {user.last_name or ''}",
-                    bio=user.bio,
-                    avatar_url=user.avatar_url,
-                    followers_count=user.followers_count,
-                    following_count=user.following_count,
-                    posts_count=user.posts_count,
-                    created_at=user.created_at,
-                ).model_dump()
-
-                post_dict = Post(
-                    id=post.post_id,
-                    user_id=post.user_id,
-                    user=user_dict,
-                    title=post.title,
-                    description=post.description,
-                    pdf_url=post.pdf_url,
-                    thumbnail_url=post.thumbnail_url,
-                    file_size=post.file_size,
-                    page_count=post.page_count,
-                    likes_count=post.likes_count,
-                    comments_count=post.comments_count,
-                    shares_count=post.shares_count,
-                    is_liked=context.get("is_liked", False),
-                    is_bookmarked=True,  # Always true since we are fetching bookmarks
-                    created_at=post.created_at,
-                ).model_dump()
-
-                posts.append(post_dict)
-
-            except PostModel.DoesNotExist:
-                # If a bookmarked post was deleted, skip it
-                logger.warning(
-                    f"Bookmarked post {bookmark.post_id} not found, skipping."
-                )
-                continue
-            except UserModel.DoesNotExist:
-                logger.warning(f"User for post {bookmark.post_id} not found, skipping.")
-                continue
+            result.append(post_dict)
 
-        return posts
+        return result
 
     except Exception as e:
         logger.error(f"Error getting bookmarks for user {user_id}: {e}")
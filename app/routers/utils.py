@@ -1,49 +1,136 @@
+import asyncio
+import base64
+import json
+import random
+import re
+import time
 from ..log_conf import logging
-from typing import Optional, List
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from datetime import datetime, timezone
 from uuid import uuid4
 import fitz
 import uuid
-from ..utils import upload_to_s3
+from pynamodb.attributes import Attribute, NumberAttribute
+from pynamodb.exceptions import PutError, TransactWriteError, UpdateError
+from pynamodb.models import Model
+from pynamodb.transactions import TransactWrite
+from ..utils import upload_to_s3, sqs_client
+from ..config import settings
+from ..cache import TTLCache, cached_get, invalidate
 
 # Import our models
-from ..models import UserModel, PostModel, ChatMessageModel, ChatConversationModel
-from ..ai.rag import get_rag_instance
+from ..models import (
+    UserModel,
+    PostModel,
+    ChatMessageModel,
+    ChatConversationModel,
+    IngestJobModel,
+    transact_write,
+    transact_get,
+    fan_out_post,
+)
+from ..ai.rag import SemanticQueryCache, get_rag_instance
 from ..ai.ai_agents import agent_runner
 # Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
+# Thumbnails are rendered straight at this width instead of at 2x page size,
+# and stored as JPEG, several times smaller than PNG for rendered pages
+THUMBNAIL_WIDTH = 600
+THUMBNAIL_JPEG_QUALITY = 80
 
 
-def get_pdf_page_count(pdf_content: bytes) -> int:
-    """Get page count from PDF bytes"""
+def generate_pdf_thumbnail(pdf_doc: fitz.Document, post_id: str) -> Optional[str]:
+    """Generate thumbnail from first page of PDF"""
     try:
-        with fitz.Document(stream=pdf_content, filetype="pdf") as pdf_doc:
-            return pdf_doc.page_count
+        if pdf_doc.page_count > 0:
+            first_page = pdf_doc[0]
+            zoom = THUMBNAIL_WIDTH / first_page.rect.width
+            pixmap = first_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            img_data = pixmap.tobytes("jpeg", jpg_quality=THUMBNAIL_JPEG_QUALITY)
+
+            # Upload thumbnail to S3
+            thumbnail_key = f"thumbnails/{post_id}_thumbnail.jpg"
+            return upload_to_s3(img_data, thumbnail_key, "image/jpeg")
     except Exception as e:
-        logger.error(f"Error getting page count: {e}")
-        return 1
+        logger.error(f"Thumbnail generation error: {e}")
+    return None
 
 
-def generate_pdf_thumbnail(pdf_content: bytes, post_id: str) -> Optional[str]:
-    """Generate thumbnail from first page of PDF"""
+def inspect_pdf(
+    pdf_content: bytes, post_id: str
+) -> Tuple[int, Optional[str], Optional[str]]:
+    """
+    Page count, thumbnail URL and text for embedding, all from a single
+    open of the PDF. The text is None if the PDF could not be read, in
+    which case the indexer extracts it itself.
+    """
     try:
         with fitz.Document(stream=pdf_content, filetype="pdf") as pdf_doc:
-            if pdf_doc.page_count > 0:
-                first_page = pdf_doc[0]
-                pixmap = first_page.get_pixmap(
-                    matrix=fitz.Matrix(2.0, 2.0)
-                )  # 2x scaling
-                img_data = pixmap.tobytes("png")
-
-                # Upload thumbnail to S3
-                thumbnail_key = f"thumbnails/{post_id}_thumbnail.png"
-                return upload_to_s3(img_data, thumbnail_key, "image/png")
+            thumbnail_url = generate_pdf_thumbnail(pdf_doc, post_id)
+            text = "\n\n".join(page.get_text() for page in pdf_doc)
+            return pdf_doc.page_count, thumbnail_url, text
     except Exception as e:
-        logger.error(f"Thumbnail generation error: {e}")
-    return None
+        logger.error(f"Error reading PDF: {e}")
+        return 1, None, None
+
+
+def encode_cursor(last_evaluated_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Opaque pagination cursor from a DynamoDB LastEvaluatedKey"""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Inverse of encode_cursor; rejects malformed cursors with a 400"""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def query_page(
+    query: Callable,
+    hash_key: str,
+    limit: int,
+    last_evaluated_key: Optional[Dict[str, Any]] = None,
+    **kwargs,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page from a PynamoDB model/index `query` in a single request,
+    plus the cursor for the next page (None on the last page)
+    """
+    results = query(
+        hash_key,
+        limit=limit,
+        page_size=limit,
+        last_evaluated_key=last_evaluated_key,
+        **kwargs,
+    )
+    items = list(results)
+    return items, encode_cursor(results.last_evaluated_key)
+
+
+# Words, keeping apostrophes inside them ("don't" -> "Don't", not "Don'T")
+_TITLE_WORD_RE = re.compile(r"[^\W_]+(?:['\u2019][^\W_]+)*")
+
+
+def smart_title(text: str) -> str:
+    """Title-case user input the way str.title() should"""
+    return _TITLE_WORD_RE.sub(lambda m: m.group(0).capitalize(), text)
+
+
+def first_index_match(index, value: str) -> Optional[UserModel]:
+    """First user in a keys-only lookup index (username/email), or None"""
+    return next(index.query(hash_key=value, limit=1), None)
 
 
 def get_user_by_id(user_id: str) -> UserModel:
@@ -62,53 +149,413 @@ def get_post_by_id(post_id: str) -> PostModel:
         raise HTTPException(status_code=404, detail="Post not found")
 
 
+# First pages of the public listing, shared by every caller. Per-user
+# context (is_liked, ...) is never cached here. Writes that change the
+# listing clear this container's copy; other containers catch up within the TTL
+PUBLIC_PAGE_TTL = 15
+_public_pages = TTLCache(maxsize=64, ttl=PUBLIC_PAGE_TTL)
+
+
+def get_public_page(offset: int, limit: int) -> Tuple[List[PostModel], Optional[str]]:
+    """Newest public posts through offset + limit, and the next cursor"""
+    key = (offset, limit)
+    page = _public_pages.get(key)
+    if page is None:
+        page = query_page(
+            PostModel.public_posts_index.query,
+            1,
+            offset + limit,
+            scan_index_forward=False,  # Descending order
+            attributes_to_get=POST_PAYLOAD_ATTRIBUTES,
+        )
+        _public_pages.set(key, page)
+    return page
+
+
+def invalidate_public_pages() -> None:
+    _public_pages.clear()
+
+
+def get_cached_user(user_id: str) -> UserModel:
+    """`get_user_by_id` through the user cache; read-only, for display"""
+    try:
+        return cached_get(UserModel, user_id)
+    except UserModel.DoesNotExist:
+        raise HTTPException(status_code=404, detail="User not found")
+
+
+def get_cached_post(post_id: str) -> PostModel:
+    """`get_post_by_id` through the post cache; read-only, for display"""
+    try:
+        return cached_get(PostModel, post_id)
+    except PostModel.DoesNotExist:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+
+def toggle_item(item: Model, key_attribute: Attribute) -> bool:
+    """
+    Create `item` unless it already exists, in which case delete it.
+    Returns True if it was created. The conditional put replaces a
+    get-then-write round-trip.
+    """
+    try:
+        item.save(condition=key_attribute.does_not_exist())
+        return True
+    except PutError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+    item.delete()
+    return False
+
+
+def adjust_counter(item: Model, attribute: NumberAttribute, delta: int) -> bool:
+    """
+    Atomically ADD `delta` to a counter in one UpdateItem instead of a
+    read-modify-write; `item` is refreshed with the new values. Counters
+    are written when an item is created, so their presence doubles as the
+    existence check: returns False if the item does not exist. A negative
+    `delta` is only applied while the counter stays >= 0, and also
+    returns False otherwise.
+    """
+    condition = attribute.exists() if delta >= 0 else attribute >= -delta
+    try:
+        item.update(actions=[attribute.add(delta)], condition=condition)
+        return True
+    except UpdateError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+    return False
+
+
+def _condition_failed(e: TransactWriteError, index: int) -> bool:
+    reasons = e.cancellation_reasons
+    return (
+        index < len(reasons)
+        and reasons[index] is not None
+        and reasons[index].code == "ConditionalCheckFailed"
+    )
+
+
+# Transactions touching a hot item (e.g. two users liking the same post)
+# are cancelled with TransactionConflict; they are safe to run again
+TRANSACTION_ATTEMPTS = 4
+TRANSACTION_RETRY_DELAY = 0.02
+
+
+def _transact(write: Callable[[TransactWrite], None]) -> None:
+    """
+    Run `write(transaction)` in one TransactWriteItems call, retrying with
+    jittered backoff while it is cancelled by a conflicting transaction
+    """
+    for attempt in range(TRANSACTION_ATTEMPTS):
+        try:
+            with transact_write() as transaction:
+                write(transaction)
+            return
+        except TransactWriteError as e:
+            conflict = any(
+                reason is not None and reason.code == "TransactionConflict"
+                for reason in e.cancellation_reasons
+            )
+            if not conflict or attempt == TRANSACTION_ATTEMPTS - 1:
+                raise
+        time.sleep(TRANSACTION_RETRY_DELAY * 2**attempt * (1 + random.random()))
+
+
+def _refresh_all(items: List[Model]) -> None:
+    """Re-read items after a transaction, in one call when there are several"""
+    if len(items) == 1:
+        items[0].refresh(consistent_read=True)
+        return
+    with transact_get() as transaction:
+        futures = [
+            transaction.get(type(item), getattr(item, item._hash_keyname))
+            for item in items
+        ]
+    for item, future in zip(items, futures):
+        item.deserialize(future.get().serialize())
+
+
+def _clamp_counter(parent: Model, counter: NumberAttribute) -> None:
+    """Reset a counter that drifted below zero; a no-op otherwise"""
+    try:
+        parent.update(actions=[counter.set(0)], condition=counter < 0)
+    except UpdateError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+
+
+def toggle_counted_item(
+    item: Model,
+    key_attribute: Attribute,
+    *counters: Tuple[Model, NumberAttribute],
+) -> Optional[bool]:
+    """
+    `toggle_item` and `adjust_counter` on each (parent, counter) pair in one
+    transaction, so the item and the counters cannot drift apart. Returns
+    True if the item was created, False if it was deleted, and None if a
+    parent does not exist. Parents are refreshed with the new counts.
+    """
+
+    def parent_missing(e: TransactWriteError) -> bool:
+        return any(_condition_failed(e, i + 1) for i in range(len(counters)))
+
+    def create(transaction: TransactWrite) -> None:
+        transaction.save(item, condition=key_attribute.does_not_exist())
+        for parent, counter in counters:
+            transaction.update(
+                parent, actions=[counter.add(1)], condition=counter.exists()
+            )
+
+    def delete(transaction: TransactWrite) -> None:
+        transaction.delete(item, condition=key_attribute.exists())
+        # Only the parent's existence is checked: a counter that already
+        # drifted to 0 must not stop the item from being removed
+        for parent, counter in counters:
+            transaction.update(
+                parent, actions=[counter.add(-1)], condition=counter.exists()
+            )
+
+    try:
+        _transact(create)
+        created = True
+    except TransactWriteError as e:
+        if parent_missing(e):
+            return None
+        if not _condition_failed(e, 0):
+            raise
+        # Already there: delete it instead
+        try:
+            _transact(delete)
+        except TransactWriteError as e:
+            if parent_missing(e):
+                return None
+            # Removed by a concurrent request, which also took the counts
+            if not _condition_failed(e, 0):
+                raise
+        created = False
+
+    # Transactions return no attributes, so read the new counts back
+    parents = [parent for parent, _ in counters]
+    _refresh_all(parents)
+    if not created:
+        for parent, counter in counters:
+            if getattr(parent, counter.attr_name) < 0:
+                _clamp_counter(parent, counter)
+                setattr(parent, counter.attr_name, 0)
+    return created
+
+
+def save_counted_item(item: Model, parent: Model, counter: NumberAttribute) -> bool:
+    """
+    Save `item` and increment the parent's counter in one transaction,
+    with no prior read of the parent. Returns False if `parent` does not
+    exist, in which case nothing is written.
+    """
+
+    def write(transaction: TransactWrite) -> None:
+        transaction.save(item)
+        transaction.update(
+            parent, actions=[counter.add(1)], condition=counter.exists()
+        )
+
+    try:
+        _transact(write)
+    except TransactWriteError as e:
+        if _condition_failed(e, 1):
+            return False
+        raise
+    return True
+
+
+def create_counted_item(
+    item: Model, key_attribute: Attribute, parent: Model, counter: NumberAttribute
+) -> bool:
+    """
+    Save `item` only if it does not exist yet, incrementing the parent's
+    counter in the same transaction. Returns False, writing nothing, when
+    the item already exists, so a retried create is not counted twice.
+    """
+
+    def write(transaction: TransactWrite) -> None:
+        transaction.save(item, condition=key_attribute.does_not_exist())
+        transaction.update(
+            parent, actions=[counter.add(1)], condition=counter.exists()
+        )
+
+    try:
+        _transact(write)
+    except TransactWriteError as e:
+        if _condition_failed(e, 0):
+            return False
+        raise
+    return True
+
+
+def build_user_payload(user: UserModel, **context: Any) -> Dict[str, Any]:
+    """
+    Response dict in the `User` schema's shape. Context-dependent fields
+    (e.g. is_following) are passed as keyword arguments.
+    """
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "email": user.email,
+        "full_name": (
+            user.full_name
+            if user.full_name is not None
+            else UserModel.build_full_name(user.first_name, user.last_name)
+        ),
+        "bio": user.bio,
+        "avatar_url": user.avatar_url,
+        "followers_count": user.followers_count,
+        "following_count": user.following_count,
+        "posts_count": user.posts_count,
+        "created_at": user.created_at,
+        **context,
+    }
+
+
+# Attributes build_post_payload reads; list queries fetch only these
+POST_PAYLOAD_ATTRIBUTES = [
+    "post_id",
+    "user_id",
+    "title",
+    "description",
+    "pdf_url",
+    "thumbnail_url",
+    "file_size",
+    "page_count",
+    "likes_count",
+    "comments_count",
+    "shares_count",
+    "created_at",
+    "is_public",
+]
+
+
+def build_post_payload(
+    post: PostModel, user: Optional[Dict[str, Any]] = None, **context: Any
+) -> Dict[str, Any]:
+    """
+    Response dict in the `Post` schema's shape, with `user` as built by
+    build_user_payload. Context-dependent fields (is_liked, is_bookmarked)
+    are passed as keyword arguments.
+    """
+    return {
+        "id": post.post_id,
+        "user_id": post.user_id,
+        "user": user,
+        "title": post.title,
+        "description": post.description,
+        "pdf_url": post.pdf_url,
+        "thumbnail_url": post.thumbnail_url,
+        "file_size": post.file_size,
+        "page_count": post.page_count,
+        "likes_count": post.likes_count,
+        "comments_count": post.comments_count,
+        "shares_count": post.shares_count,
+        "created_at": post.created_at,
+        "is_public": post.is_public == 1,
+        **context,
+    }
+
+
 # Background task functions
-def process_pdf_embeddings(pdf_content: bytes, post_id: str, title: str):
-    """Background task to process PDF for embeddings"""
+async def process_pdf_embeddings(
+    pdf_content: bytes, post_id: str, title: str, text: Optional[str] = None
+):
+    """
+    Background task to process PDF for embeddings. `text` is the PDF's
+    already extracted text, if any.
+    """
     try:
         # This extract text and create embeddings for vector search
         logger.info(f"Processing PDF embeddings for post {post_id}")
         rag = get_rag_instance()
         rag.create_index_if_not_exists()
-        result = rag.upsert_pdf(pdf_content, title, post_id=post_id)
+        if settings.async_batch_enabled:
+            result = await rag.upsert_pdf_batch(
+                pdf_content, title, post_id=post_id, text=text
+            )
+        else:
+            result = await rag.upsert_pdf(
+                pdf_content, title, post_id=post_id, text=text
+            )
         return result
     except Exception as e:
         logger.error(f"PDF processing error for {post_id}: {e}")
 
 
+def set_job_status(job_id: Optional[str], status: str, **fields):
+    """Record an upload job's progress; failures here never break the upload"""
+    if not job_id:
+        return
+    actions = [
+        IngestJobModel.status.set(status),
+        IngestJobModel.updated_at.set(datetime.now(timezone.utc)),
+    ]
+    actions += [getattr(IngestJobModel, name).set(value) for name, value in fields.items()]
+    try:
+        IngestJobModel(job_id).update(actions=actions)
+    except Exception as e:
+        logger.error(f"Error updating job {job_id}: {e}")
+
+
 def delete_embeddings(post_id: str):
     rag = get_rag_instance()
     rag.delete_embeddings(post_id)
 
 
-def background_create_post(
+async def background_create_post(
     pdf_content: bytes,
     title: Optional[str],
     is_public: bool,
     description: Optional[str],
     current_user_id: str,
+    job_id: Optional[str] = None,
+    post_id: Optional[str] = None,
+    pdf_url: Optional[str] = None,
 ):
-    """Background task to create a new PDF post"""
+    """
+    Background task to create a new PDF post. Queued uploads pass the
+    `post_id` and `pdf_url` the PDF was already stored under.
+    """
+    embedding = None
     try:
         # Generate unique post ID
-        post_id = str(uuid.uuid4())
-
-        # Upload PDF to S3
-        pdf_key = f"posts/{post_id}.pdf"
-        pdf_url = upload_to_s3(pdf_content, pdf_key, "application/pdf")
-
-        # Get PDF metadata
-        page_count = get_pdf_page_count(pdf_content)
+        post_id = post_id or str(uuid.uuid4())
+        await asyncio.to_thread(set_job_status, job_id, "processing", post_id=post_id)
+
+        async def upload_pdf() -> str:
+            if pdf_url:
+                return pdf_url
+            pdf_key = f"posts/{post_id}.pdf"
+            return await asyncio.to_thread(
+                upload_to_s3, pdf_content, pdf_key, "application/pdf"
+            )
+
+        # Upload the PDF while it is read: metadata, thumbnail and the text
+        # for embedding come from one parse
+        pdf_url, (page_count, thumbnail_url, text) = await asyncio.gather(
+            upload_pdf(),
+            asyncio.to_thread(inspect_pdf, pdf_content, post_id),
+        )
         file_size = len(pdf_content)
+        post_title = smart_title(title) if title else "Untitled"
 
-        # Generate thumbnail
-        thumbnail_url = generate_pdf_thumbnail(pdf_content, post_id)
+        # Embedding only needs the PDF, so it runs alongside the post writes
+        # and the feed fan-out
+        embedding = asyncio.create_task(
+            process_pdf_embeddings(pdf_content, post_id, post_title, text=text)
+        )
 
         # Create post record in DynamoDB
+        now = datetime.now(timezone.utc)
         post = PostModel(
             post_id=post_id,
             user_id=current_user_id,
-            title=title.title() if title else "Untitled",
+            title=post_title,
             description=description or "",
             pdf_url=pdf_url,
             thumbnail_url=thumbnail_url or "",
@@ -117,60 +564,151 @@ def background_create_post(
             likes_count=0,
             comments_count=0,
             shares_count=0,
-            is_public=1 if is_public else 0,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
+            is_public=1 if is_public else None,
+            created_at=now,
+            updated_at=now,
         )
-        post.save()
-
-        # Update user's post count
-        user = get_user_by_id(current_user_id)
-        user.posts_count += 1
-        user.save()
-
-        # Process PDF for embeddings in background
-        process_pdf_embeddings(pdf_content, post_id, post.title)
+        # Save the post and update the user's post count together. SQS can
+        # redeliver a message after this step; the post then already exists
+        # and the rest of the pipeline (fan-out, embedding) is simply rerun
+        created = await asyncio.to_thread(
+            create_counted_item,
+            post,
+            PostModel.post_id,
+            UserModel(current_user_id),
+            UserModel.posts_count,
+        )
+        if not created:
+            # Fan out the stored post, not this copy: its created_at keys the
+            # feed rows already written, and the owner may have changed its
+            # visibility since the first delivery
+            logger.info(f"Post {post_id} already saved; resuming ingestion")
+            post = await asyncio.to_thread(
+                PostModel.get, post_id, consistent_read=True
+            )
+        invalidate(UserModel, current_user_id)
+        if post.is_public == 1:
+            invalidate_public_pages()
+        await asyncio.to_thread(fan_out_post, post)
+
+        await asyncio.to_thread(set_job_status, job_id, "embedding")
+        result = await embedding
+        if result is None:
+            await asyncio.to_thread(
+                set_job_status, job_id, "failed", error="Indexing failed"
+            )
+        else:
+            await asyncio.to_thread(set_job_status, job_id, "done")
 
         logger.info(f"Post {post_id} created successfully")
 
     except Exception as e:
         logger.error(f"Error creating post: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to create post: {str(e)}")
+        if embedding is not None:
+            embedding.cancel()
+        await asyncio.to_thread(set_job_status, job_id, "failed", error=str(e))
+        # Runs in a background task or the queue worker, never in a request
+        raise
+
+
+def enqueue_post_ingest(
+    pdf_file: BinaryIO,
+    title: Optional[str],
+    is_public: bool,
+    description: Optional[str],
+    current_user_id: str,
+    job_id: str,
+) -> None:
+    """
+    Stream the uploaded PDF to S3 and queue its ingestion for the SQS
+    worker. The message carries the S3 key, not the bytes (SQS messages
+    are capped at 256 KB).
+    """
+    post_id = str(uuid.uuid4())
+    pdf_key = f"posts/{post_id}.pdf"
+    pdf_url = upload_to_s3(pdf_file, pdf_key, "application/pdf")
+    sqs_client.send_message(
+        QueueUrl=settings.ingest_queue_url,
+        MessageBody=json.dumps(
+            {
+                "post_id": post_id,
+                "pdf_key": pdf_key,
+                "pdf_url": pdf_url,
+                "title": title,
+                "is_public": is_public,
+                "description": description,
+                "user_id": current_user_id,
+                "job_id": job_id,
+            }
+        ),
+    )
+
+
+def sse_frame(text: str) -> bytes:
+    """Encode a text delta as one Server-Sent Events message"""
+    lines = "".join(f"data: {line}\n" for line in text.split("\n"))
+    return f"{lines}\n".encode("utf-8")
 
 
 async def response_generator(
     post_id: str, messages: List, conversation: ChatConversationModel
 ):
-    complete_response = ""
+    parts = []
     async for chunk in agent_runner(messages, post_id=post_id):
-        complete_response += chunk
-        yield chunk
+        parts.append(chunk)
+        yield sse_frame(chunk)
+    complete_response = "".join(parts)
 
     # After streaming completes, save the assistant message
-    conversation.updated_at = datetime.now(timezone.utc)
-    conversation.save()
-
+    now = datetime.now(timezone.utc)
     assistant_message = ChatMessageModel(
         message_id=str(uuid4()),
         conversation_id=conversation.conversation_id,
         role="assistant",
         content=complete_response,
-        timestamp=datetime.now(timezone.utc),
+        timestamp=now,
     )
-    assistant_message.save()
+    await asyncio.to_thread(_save_assistant_turn, conversation, assistant_message, now)
 
 
-def semantic_search(query: str) -> List[str]:
-    rag = get_rag_instance()
-    res = rag.retrieval(query, top_k=50)
-
-    post_ids = set()
-    for c in res:
-        meta = c.get("metadata", {})
-        post_id = meta.get("post_id", None)
-        print(
-            f"Found {meta.get('source')} with score: {c.get('score')} post_id: {post_id}"
+def _save_assistant_turn(
+    conversation: ChatConversationModel,
+    assistant_message: ChatMessageModel,
+    now: datetime,
+):
+    # One round-trip; only the conversation timestamp changes, so it is a partial update
+    with transact_write() as transaction:
+        transaction.save(assistant_message)
+        transaction.update(
+            conversation, actions=[ChatConversationModel.updated_at.set(now)]
         )
-        if post_id and post_id not in post_ids:
-            post_ids.add(post_id)
+
+
+# Ranked post ids per query, also served to near-identical rewordings;
+# new posts show up within the TTL
+SEARCH_CACHE_TTL = 300
+_search_cache = SemanticQueryCache(
+    maxsize=512, semantic_size=64, ttl=SEARCH_CACHE_TTL
+)
+
+
+async def semantic_search(query: str) -> List[str]:
+    post_ids = _search_cache.get(None, query)
+    if post_ids is None:
+        vector = (await get_rag_instance().embed_queries([query]))[0]
+        post_ids = _search_cache.get_similar(None, vector)
+        if post_ids is None:
+            post_ids = await _semantic_search(query, vector)
+            _search_cache.put(None, query, vector, post_ids)
     return list(post_ids)
+
+
+async def _semantic_search(query: str, query_vector: List[float]) -> List[str]:
+    rag = get_rag_instance()
+    res = await rag.retrieval(query, top_k=50, query_vector=query_vector)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Search {query!r} matched {len(res)} chunks")
+    # Post ids in order of their best-scoring chunk
+    post_ids = (c.get("metadata", {}).get("post_id") for c in res)
+    return list(dict.fromkeys(post_id for post_id in post_ids if post_id))
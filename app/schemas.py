@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, EmailStr, field_validator
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 
 class UserLogin(BaseModel):
@@ -43,9 +43,7 @@ class User(BaseModel):
         last = getattr(values, "last_name", None) or ""
         return f"{first} {last}".strip() if first or last else None
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class Post(BaseModel):
@@ -66,9 +64,7 @@ class Post(BaseModel):
     created_at: datetime
     is_public: Optional[bool] = True
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class Comment(BaseModel):
@@ -79,9 +75,7 @@ class Comment(BaseModel):
     content: str
     created_at: datetime
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class ChatConversation(BaseModel):
@@ -92,9 +86,7 @@ class ChatConversation(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class ChatMessage(BaseModel):
@@ -104,9 +96,7 @@ class ChatMessage(BaseModel):
     content: str
     timestamp: datetime
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class FollowRelationship(BaseModel):
@@ -115,9 +105,7 @@ class FollowRelationship(BaseModel):
     following_id: str
     created_at: datetime
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class Like(BaseModel):
@@ -126,9 +114,7 @@ class Like(BaseModel):
     user_id: str
     created_at: datetime
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class Bookmark(BaseModel):
@@ -137,9 +123,18 @@ class Bookmark(BaseModel):
     user_id: str
     created_at: datetime
 
-    class Config:
-        validate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
+    model_config = ConfigDict(validate_by_name=True)
+
+
+class IngestJob(BaseModel):
+    id: str = Field(alias="job_id")
+    status: str  # pending, processing, embedding, done or failed
+    post_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(validate_by_name=True)
 
 
 # Update forward references
@@ -168,6 +163,14 @@ class UserUpdateRequest(BaseModel):
     first_name: Optional[str] = Field(None, max_length=30)
     last_name: Optional[str] = Field(None, max_length=30)
     bio: Optional[str] = Field(None, max_length=500)
+    # URL from POST /users/profile/avatar-upload, once the file is uploaded
+    avatar_url: Optional[str] = None
+
+
+class AvatarUploadResponse(BaseModel):
+    upload_url: str
+    fields: Dict[str, str]
+    avatar_url: str
 
 
 class TokenResponse(BaseModel):
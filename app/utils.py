@@ -1,35 +1,68 @@
 from .log_conf import logging
+import io
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 from passlib.context import CryptContext
-import re
+import string
 from .config import settings
 
 # Configure logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 
-s3_client = boto3.client("s3")
+# Module-level clients survive Lambda container reuse with their pools
+AWS_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={"mode": "adaptive"},
+    tcp_keepalive=True,
+    connect_timeout=3,
+)
+s3_client = boto3.client("s3", config=AWS_CLIENT_CONFIG)
+sqs_client = boto3.client("sqs", config=AWS_CLIENT_CONFIG)
 S3_BUCKET = settings.s3_bucket
 STAGE = settings.stage
 
+# Objects above the threshold go up as parallel 8 MB multipart parts;
+# smaller ones stay a single PutObject
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_SIZE,
+    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    max_concurrency=4,
+    use_threads=True,
+)
+
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+# Character class bit per byte: upper, lower, digit, special
+_PASSWORD_CLASSES = [0] * 256
+for _chars, _bit in (
+    (string.ascii_uppercase, 1),
+    (string.ascii_lowercase, 2),
+    (string.digits, 4),
+    ('!@#$%^&*(),.?":{}|<>', 8),
+):
+    for _char in _chars:
+        _PASSWORD_CLASSES[ord(_char)] = _bit
+_ALL_PASSWORD_CLASSES = 0b1111
+
+
 def is_strong_password(password: str) -> bool:
-    """Check password strength."""
-    if (
-        len(password) < 8
-        or not re.search(r"[A-Z]", password)
-        or not re.search(r"[a-z]", password)
-        or not re.search(r"[0-9]", password)
-        or not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password)
-    ):
+    """Check password strength: 8+ characters with every character class."""
+    if len(password) < 8:
         return False
-    return True
+    flags = 0
+    # Non-ASCII characters encode to bytes >= 0x80, which belong to no class
+    for byte in password.encode():
+        flags |= _PASSWORD_CLASSES[byte]
+    return flags == _ALL_PASSWORD_CLASSES
 
 
 def hash_password(password: str) -> str:
@@ -42,18 +75,75 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def upload_to_s3(file_content: bytes, key: str, content_type: str) -> str:
-    """Upload file to S3 and return URL"""
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify password against hash; also returns a new hash when the stored
+    one uses a deprecated scheme or cost, else None
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def s3_url(key: str) -> str:
+    """Public URL stored for an uploaded object"""
+    return f"https://{S3_BUCKET}.s3.amazonaws.com/{STAGE}/{key}"
+
+
+def upload_to_s3(
+    file_content: Union[bytes, BinaryIO], key: str, content_type: str
+) -> str:
+    """Upload file to S3 and return URL. File objects are streamed, not read into memory"""
+    if isinstance(file_content, bytes):
+        file_content = io.BytesIO(file_content)
     try:
-        s3_client.put_object(
-            Bucket=S3_BUCKET, Key=key, Body=file_content, ContentType=content_type
+        s3_client.upload_fileobj(
+            file_content,
+            S3_BUCKET,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=S3_TRANSFER_CONFIG,
         )
-        return f"https://{S3_BUCKET}.s3.amazonaws.com/{STAGE}/{key}"
-    except ClientError as e:
+        return s3_url(key)
+    except (ClientError, S3UploadFailedError) as e:
         logger.error(f"S3 upload error: {e}")
         raise HTTPException(status_code=500, detail="File upload failed")
 
 
+def presign_s3_upload(
+    key: str, content_type: str, max_size: int, expires_in: int = 300
+) -> Dict[str, Any]:
+    """
+    Presigned POST letting the client upload straight to S3; the policy
+    pins the key and content type and caps the size. Returns S3's
+    {"url", "fields"}. Signing is local, no request is made.
+    """
+    try:
+        return s3_client.generate_presigned_post(
+            Bucket=S3_BUCKET,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_size],
+            ],
+            ExpiresIn=expires_in,
+        )
+    except ClientError as e:
+        logger.error(f"S3 presign error: {e}")
+        raise HTTPException(status_code=500, detail="Could not prepare upload")
+
+
+def download_from_s3(key: str) -> bytes:
+    """Read a file from S3"""
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET, Key=key)
+        return response["Body"].read()
+    except ClientError as e:
+        logger.error(f"S3 download error: {e}")
+        raise HTTPException(status_code=500, detail="File download failed")
+
+
 def delete_from_s3(key: str):
     """Delete file from S3"""
     try:
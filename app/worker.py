@@ -0,0 +1,57 @@
+import asyncio
+import json
+from typing import Any, Dict
+
+from .log_conf import logging
+from .utils import download_from_s3
+from .routers.utils import background_create_post
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def is_sqs_event(event: Dict[str, Any]) -> bool:
+    records = event.get("Records") or []
+    return bool(records) and records[0].get("eventSource") == "aws:sqs"
+
+
+async def process_ingest_message(body: Dict[str, Any]) -> None:
+    """Run the post-ingest pipeline for one message from enqueue_post_ingest"""
+    pdf_content = await asyncio.to_thread(download_from_s3, body["pdf_key"])
+    await background_create_post(
+        pdf_content,
+        body["title"],
+        body["is_public"],
+        body["description"],
+        body["user_id"],
+        body["job_id"],
+        post_id=body["post_id"],
+        pdf_url=body["pdf_url"],
+    )
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    # Reuse the loop across warm invocations: the cached Gemini and
+    # Pinecone clients hold connections bound to it
+    try:
+        return asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+
+
+def handle_sqs_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lambda handler for the ingest queue. Failed messages are reported
+    individually so SQS retries only those (ReportBatchItemFailures).
+    """
+    loop = _event_loop()
+    failures = []
+    for record in event["Records"]:
+        try:
+            loop.run_until_complete(process_ingest_message(json.loads(record["body"])))
+        except Exception as e:
+            logger.error(f"Error processing ingest message {record['messageId']}: {e}")
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
@@ -9,6 +9,9 @@ from app.models import (
     ChatMessageModel,
     Notification,
     BookmarkModel,
+    IngestJobModel,
+    FeedModel,
+    fan_out_post,
 )
 from app.utils import hash_password, is_strong_password
 
@@ -30,6 +33,8 @@ def create_tables():
         ChatMessageModel,
         Notification,
         BookmarkModel,
+        IngestJobModel,
+        FeedModel,
     ]
     for table in tables:
         if not table.exists():
@@ -37,6 +42,61 @@ def create_tables():
             table.create_table(wait=True)  # wait=True waits for table creation
         else:
             print(f"Table {table.Meta.table_name} already exists")
+            # Turn on TTL for tables created before they had a TTL attribute;
+            # fails harmlessly when it is already on
+            table.update_ttl(ignore_update_ttl_errors=True)
+
+
+@app.command()
+def backfill_private_posts():
+    """
+    Remove is_public=0 from private posts so they drop out of the sparse
+    public posts index.
+    """
+    count = 0
+    for post in PostModel.scan(PostModel.is_public == 0):
+        post.update(actions=[PostModel.is_public.remove()])
+        count += 1
+    print(f"Updated {count} private posts")
+
+
+@app.command()
+def backfill_feeds():
+    """
+    Fill the feed table from existing posts, for deployments that predate it.
+    """
+    count = 0
+    for post in PostModel.scan():
+        fan_out_post(post)
+        count += 1
+    print(f"Fanned out {count} posts")
+
+
+@app.command()
+def backfill_full_names():
+    """
+    Store full_name on users created before it was denormalized.
+    """
+    count = 0
+    for user in UserModel.scan(UserModel.full_name.does_not_exist()):
+        full_name = UserModel.build_full_name(user.first_name, user.last_name)
+        user.update(actions=[UserModel.full_name.set(full_name)])
+        count += 1
+    print(f"Updated {count} users")
+
+
+@app.command()
+def backfill_admin_flags():
+    """
+    Set admin_flag on superusers created before the superuser index existed.
+    """
+    count = 0
+    for user in UserModel.scan(
+        (UserModel.is_superuser == True) & UserModel.admin_flag.does_not_exist()  # noqa: E712
+    ):
+        user.update(actions=[UserModel.admin_flag.set(1)])
+        count += 1
+    print(f"Updated {count} admins")
 
 
 @app.command()
@@ -66,6 +126,7 @@ def create_admin(
         email=email,
         password=hashed_password,
         is_superuser=True,
+        admin_flag=1,
     )
     admin_user.save()
     print(f"Admin user '{username}' created successfully.")
@@ -82,9 +143,9 @@ def list_admins():
     if confirmation.lower() != "yes":
         print("Operation cancelled.")
         raise typer.Exit()
-    admins = UserModel.scan(UserModel.is_superuser)
+    admins = UserModel.superuser_index.query(1)
     for admin in admins:
-        print(f"ID: {admin.id}, Username: {admin.username}, Email: {admin.email}")
+        print(f"ID: {admin.user_id}, Username: {admin.username}, Email: {admin.email}")
 
 
 @app.command()
@@ -1,10 +1,13 @@
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
+import boto3
 from awsglue import DynamicFrame
 from awsglue.context import GlueContext
 from awsglue.job import Job
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
+from pyspark.conf import SparkConf
 from pyspark.context import SparkContext
 
 def sparkSqlQuery(
@@ -15,7 +18,25 @@ def sparkSqlQuery(
     result = spark.sql(query)
     return DynamicFrame.fromDF(result, glueContext, transformation_ctx)
 
-def read_dynamodb_table(glueContext, table_name, splits=100, read_percent="1.0"):
+def read_dynamodb_table(
+    glueContext, table_name, splits=100, read_percent="1.0", export_bucket=None
+):
+    if export_bucket:
+        # Read a point-in-time export from S3 instead of scanning the table:
+        # no read capacity is consumed. Needs PITR enabled on the table.
+        table_arn = boto3.client("dynamodb").describe_table(TableName=table_name)[
+            "Table"
+        ]["TableArn"]
+        return glueContext.create_dynamic_frame.from_options(
+            connection_type="dynamodb",
+            connection_options={
+                "dynamodb.export": "ddb",
+                "dynamodb.tableArn": table_arn,
+                "dynamodb.s3.bucket": export_bucket,
+                "dynamodb.s3.prefix": f"dynamodb-exports/{table_name}/",
+                "dynamodb.unnestDDBJson": True,
+            }
+        )
     return glueContext.create_dynamic_frame.from_options(
         connection_type="dynamodb",
         connection_options={
@@ -26,17 +47,21 @@ def read_dynamodb_table(glueContext, table_name, splits=100, read_percent="1.0")
     )
 
 def write_to_s3(glueContext, dyf, path, format="parquet"):
+    # ZSTD (level 3 by default) compresses smaller than the Snappy default
+    format_options = {"compression": "zstd"} if format == "parquet" else {}
     glueContext.write_dynamic_frame.from_options(
         frame=dyf,
         connection_type="s3",
         connection_options={"path": path},
-        format=format
+        format=format,
+        format_options=format_options
     )
 
 args = getResolvedOptions(
     sys.argv, ["JOB_NAME", "stage", "target_path"]
 )
-sc = SparkContext()
+# FAIR scheduling lets the per-table jobs below share executors
+sc = SparkContext(conf=SparkConf().set("spark.scheduler.mode", "FAIR"))
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
@@ -44,6 +69,10 @@ job.init(args["JOB_NAME"], args)
 
 stage = args["stage"]
 target_path = args["target_path"]
+# Optional: bucket for DynamoDB exports; without it the tables are scanned
+export_bucket = None
+if "--export_bucket" in sys.argv:
+    export_bucket = getResolvedOptions(sys.argv, ["export_bucket"])["export_bucket"]
 
 # Table configs: (table_suffix, select_fields, s3_subpath)
 tables = [
@@ -55,10 +84,16 @@ tables = [
     ("comments", ["user_id", "post_id", "content"], "interactions/comments/"),
 ]
 
-for suffix, fields, subpath in tables:
+def extract_table(config):
+    suffix, fields, subpath = config
     table_name = f"docgram-{stage}-{suffix}"
-    dyf = read_dynamodb_table(glueContext, table_name)
+    dyf = read_dynamodb_table(glueContext, table_name, export_bucket=export_bucket)
     dyf = dyf.select_fields(paths=fields)
     write_to_s3(glueContext, dyf, f"{target_path}/{subpath}")
 
+# The tables are independent, so submit their Spark jobs concurrently;
+# list() re-raises the first failure
+with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+    list(executor.map(extract_table, tables))
+
 job.commit()
\ No newline at end of file
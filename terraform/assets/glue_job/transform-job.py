@@ -14,11 +14,13 @@ def read_parquet(glueContext, path):
     )
 
 def write_parquet(glueContext, dyf, path):
+    # ZSTD (level 3 by default) compresses smaller than the Snappy default
     glueContext.write_dynamic_frame.from_options(
         frame=dyf,
         connection_type="s3",
         connection_options={"path": path},
-        format="parquet"
+        format="parquet",
+        format_options={"compression": "zstd"}
     )
 
 args = getResolvedOptions(
@@ -29,6 +31,8 @@ glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args["JOB_NAME"], args)
+# Let Spark coalesce shuffle partitions and pick join strategies at runtime
+spark.conf.set("spark.sql.adaptive.enabled", "true")
 
 source_path = args["source_path"]
 target_path = args["target_path"]
@@ -49,36 +53,35 @@ bookmarks_df = bookmarks.toDF()
 
 # Aggregate interactions
 
-# Likes per user per post
-likes_agg = likes_df.groupBy("user_id", "post_id").agg(F.lit(1).alias("liked"))
-
-# Bookmarks per user per post
-bookmarks_agg = bookmarks_df.groupBy("user_id", "post_id").agg(F.lit(1).alias("bookmarked"))
+# Tag each interaction with its kind and group them all in one shuffle;
+# likes and bookmarks are unique per user-post, so max() just flags them
+no_content = F.lit(None).cast("string").alias("content")
+interactions = likes_df.select(
+    "user_id", "post_id", F.lit(1).alias("liked"), F.lit(0).alias("bookmarked"), no_content
+).unionByName(bookmarks_df.select(
+    "user_id", "post_id", F.lit(0).alias("liked"), F.lit(1).alias("bookmarked"), no_content
+)).unionByName(comments_df.select(
+    "user_id", "post_id", F.lit(0).alias("liked"), F.lit(0).alias("bookmarked"), "content"
+))
 
-# Comments per user per post
-comments_agg = comments_df.groupBy("user_id", "post_id") \
+# count() and collect_list() skip the null content of likes and bookmarks
+result = interactions.groupBy("user_id", "post_id") \
     .agg(
+        F.max("liked").alias("liked"),
+        F.max("bookmarked").alias("bookmarked"),
         F.count("content").alias("comments_count"),
         F.collect_list("content").alias("comments")
     )
 
-# Start with all user-post pairs that have any interaction
-user_post = likes_agg.select("user_id", "post_id") \
-    .union(bookmarks_agg.select("user_id", "post_id")) \
-    .union(comments_agg.select("user_id", "post_id")) \
-    .dropDuplicates()
-
-# Join all interaction types
-result = user_post \
-    .join(likes_agg, ["user_id", "post_id"], "left") \
-    .join(bookmarks_agg, ["user_id", "post_id"], "left") \
-    .join(comments_agg, ["user_id", "post_id"], "left") \
-    .fillna({"liked": 0, "bookmarked": 0, "comments_count": 0, "comments": []})
-
-# Optionally, join with user and post info
+# Optionally, join with user and post info; both are small enough to
+# broadcast instead of shuffling the interactions again
 result = result \
-    .join(users_df, "user_id", "left") \
-    .join(posts_df, "post_id", "left")
+    .join(F.broadcast(users_df), "user_id", "left") \
+    .join(F.broadcast(posts_df), "post_id", "left")
+
+# Cluster rows by post so each file has narrow post_id min/max stats for
+# predicate pushdown; AQE coalesces the shuffle into fewer, larger files
+result = result.repartition("post_id").sortWithinPartitions("post_id", "user_id")
 
 # Convert back to DynamicFrame and write
 final_dyf = DynamicFrame.fromDF(result, glueContext, "final_dyf")
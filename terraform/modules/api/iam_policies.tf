@@ -86,6 +86,16 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "s3:DeleteObject"
         ]
         Resource = "${aws_s3_bucket.docgram_storage.arn}/*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.ingest.arn
       }
     ]
   })
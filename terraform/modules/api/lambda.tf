@@ -44,6 +44,7 @@ resource "aws_lambda_function" "docgram_lambda" {
       SECRET_KEY                    = var.secret_key
       ALGORITHM                     = "HS256"
       ACCESS_TOKEN_EXPIRE_MINUTES   = "30"
+      INGEST_QUEUE_URL              = aws_sqs_queue.ingest.url
     }
   }
   depends_on = [
@@ -60,4 +61,41 @@ resource "aws_cloudwatch_log_group" "docgram_lambda_logs" {
   name              = "/aws/lambda/${var.project}"
   retention_in_days = 14
   tags              = var.tags
+}
+
+# Ingest worker: same image, fed by the ingest queue (app.main.handler
+# routes SQS events to app.worker). Parsing, embedding and upserting a
+# large PDF takes far longer than an API request, and PDF parsing is CPU
+# bound, which Lambda scales with memory
+resource "aws_lambda_function" "docgram_worker" {
+  function_name = "${var.project}-worker"
+  role         = aws_iam_role.lambda_role.arn
+  package_type = "Image"
+  image_uri    = "${aws_ecr_repository.docgram_repo.repository_url}:${var.image_tag}"
+  timeout      = var.worker_timeout
+  memory_size  = 2048
+  architectures = ["x86_64"]
+  environment {
+    variables = {
+      GEMINI_API_KEY                = var.gemini_api_key
+      PINECONE_API_KEY              = var.pinecone_api_key
+      STAGE                         = var.stage
+      SECRET_KEY                    = var.secret_key
+      ALGORITHM                     = "HS256"
+      ACCESS_TOKEN_EXPIRE_MINUTES   = "30"
+    }
+  }
+  depends_on = [
+    aws_iam_role_policy.lambda_policy,
+    aws_cloudwatch_log_group.docgram_worker_logs,
+    null_resource.build_and_push_image,
+    aws_ecr_repository_policy.docgram_repo_policy,
+  ]
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_log_group" "docgram_worker_logs" {
+  name              = "/aws/lambda/${var.project}-worker"
+  retention_in_days = 14
+  tags              = var.tags
 }
\ No newline at end of file
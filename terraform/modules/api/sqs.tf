@@ -0,0 +1,23 @@
+# Post ingestion queue, consumed by the ingest worker function (app.worker)
+resource "aws_sqs_queue" "ingest_dlq" {
+  name                      = "${var.project}-${var.stage}-ingest-dlq"
+  message_retention_seconds = 1209600
+  tags                      = var.tags
+}
+
+resource "aws_sqs_queue" "ingest" {
+  name                       = "${var.project}-${var.stage}-ingest"
+  visibility_timeout_seconds = 6 * var.worker_timeout # 6x the worker timeout
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.ingest_dlq.arn
+    maxReceiveCount     = 3
+  })
+  tags = var.tags
+}
+
+resource "aws_lambda_event_source_mapping" "ingest" {
+  event_source_arn        = aws_sqs_queue.ingest.arn
+  function_name           = aws_lambda_function.docgram_worker.arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
+}
@@ -46,4 +46,10 @@ variable "secret_key" {
   description = "Secret key for JWT"
   type        = string
   sensitive   = true
-}
\ No newline at end of file
+}
+
+variable "worker_timeout" {
+  description = "Timeout in seconds of the ingest worker Lambda"
+  type        = number
+  default     = 300
+}